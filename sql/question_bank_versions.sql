@@ -0,0 +1,42 @@
+-- question_bank_versions: one change counter per question table.
+--
+-- The app keeps mock_questions and diagram_questions in memory
+-- (src/question_bank.py) and polls this table to notice changes made by
+-- any process: imports, duplicate cleanup, edits in the dashboard. A
+-- statement-level trigger bumps the counter on every insert, update and
+-- delete, so updated rows are noticed too. Until this is applied the app
+-- falls back to comparing the row count and highest id, which misses
+-- edits to existing questions.
+
+create table if not exists question_bank_versions (
+    table_name text primary key,
+    version bigint not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function bump_question_bank_version() returns trigger
+language plpgsql
+as $$
+begin
+    insert into question_bank_versions (table_name, version, updated_at)
+    values (TG_TABLE_NAME, 1, now())
+    on conflict (table_name) do update
+    set version = question_bank_versions.version + 1,
+        updated_at = excluded.updated_at;
+    return null;
+end;
+$$;
+
+drop trigger if exists mock_questions_version on mock_questions;
+create trigger mock_questions_version
+    after insert or update or delete or truncate on mock_questions
+    for each statement execute function bump_question_bank_version();
+
+drop trigger if exists diagram_questions_version on diagram_questions;
+create trigger diagram_questions_version
+    after insert or update or delete or truncate on diagram_questions
+    for each statement execute function bump_question_bank_version();
+
+insert into question_bank_versions (table_name)
+values ('mock_questions'), ('diagram_questions')
+on conflict (table_name) do nothing;
@@ -0,0 +1,30 @@
+-- recent_test_history: the last p_limit attempts per subject for one user.
+--
+-- Used by Database.get_recent_test_history (src/database.py) to load the
+-- dashboard history in one bounded request, however long a user's history
+-- grows. While the function is missing the app falls back to a single
+-- request bounded to limit * number of subjects rows; the index serves both.
+
+create index if not exists test_history_user_subject_date
+    on test_history (user_id, subject, test_date desc);
+
+create or replace function recent_test_history(
+    p_user_id uuid,
+    p_subjects text[] default null,
+    p_limit integer default 10
+) returns setof test_history
+language sql
+stable
+as $$
+    select h.*
+    from test_history h
+    join (
+        select id,
+               row_number() over (partition by subject order by test_date desc) as position
+        from test_history
+        where user_id = p_user_id
+          and (p_subjects is null or subject = any(p_subjects))
+    ) ranked on ranked.id = h.id
+    where ranked.position <= p_limit
+    order by h.subject, h.test_date desc;
+$$;
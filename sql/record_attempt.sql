@@ -0,0 +1,83 @@
+-- record_attempt: store a test result and advance subject progress in one call.
+--
+-- Used by Database.record_attempt (src/database.py) so that an answer
+-- submission is a single round trip. Apply it in the Supabase SQL editor
+-- (or with psql) once per project; the app falls back to separate
+-- requests while the function is missing.
+
+create or replace function record_attempt(
+    p_user_id uuid,
+    p_subject text,
+    p_score double precision,
+    p_time_taken double precision,
+    p_num_questions integer,
+    p_correct_answers integer
+) returns json
+language plpgsql
+as $$
+declare
+    v_current text;
+    v_new text;
+    v_now timestamptz := now();
+begin
+    select difficulty_level into v_current
+    from subject_progress
+    where user_id = p_user_id and subject = p_subject
+    limit 1
+    for update;
+
+    v_current := coalesce(v_current, 'beginner');
+
+    insert into test_history (
+        user_id, subject, score, difficulty_level, time_taken,
+        num_questions, correct_answers, test_date
+    ) values (
+        p_user_id, p_subject, p_score, v_current, p_time_taken,
+        p_num_questions, p_correct_answers, v_now
+    );
+
+    -- Same advancement rule as submit_answer: 70% moves up one level
+    if p_score >= 0.7 then
+        v_new := case v_current
+            when 'beginner' then 'intermediate'
+            when 'intermediate' then 'advanced'
+            when 'advanced' then 'advanced'
+            else 'beginner'
+        end;
+        if v_new = v_current then
+            -- Already at the top level: the result is recorded, progress unchanged
+            return json_build_object(
+                'previous_difficulty', v_current,
+                'difficulty_level', v_current,
+                'difficulty_changed', false
+            );
+        end if;
+    else
+        v_new := v_current;
+    end if;
+
+    -- Update, then insert on first attempt, so this works whether or not the
+    -- (user_id, subject) constraint from subject_progress_unique.sql exists
+    update subject_progress
+    set current_score = p_score,
+        difficulty_level = v_new,
+        mastered = (v_new <> v_current and v_new = 'advanced'),
+        last_attempt = v_now
+    where user_id = p_user_id and subject = p_subject;
+
+    if not found then
+        insert into subject_progress (
+            user_id, subject, current_score, difficulty_level, mastered, last_attempt
+        ) values (
+            p_user_id, p_subject, p_score, v_new,
+            (v_new <> v_current and v_new = 'advanced'), v_now
+        );
+    end if;
+
+    return json_build_object(
+        'previous_difficulty', v_current,
+        'difficulty_level', v_new,
+        'difficulty_changed', v_new <> v_current
+    );
+end;
+$$;
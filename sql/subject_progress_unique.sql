@@ -0,0 +1,19 @@
+-- One subject_progress row per (user_id, subject).
+--
+-- Database.update_subject_progress upserts with this pair as the conflict
+-- target; without the constraint it falls back to a lookup followed by an
+-- update or insert, which takes more requests and can race. Existing
+-- duplicates (left by the old update-then-insert path) are removed first,
+-- keeping the most recent attempt.
+
+delete from subject_progress a
+using subject_progress b
+where a.user_id = b.user_id
+  and a.subject = b.subject
+  and (
+      coalesce(a.last_attempt, '-infinity') < coalesce(b.last_attempt, '-infinity')
+      or (coalesce(a.last_attempt, '-infinity') = coalesce(b.last_attempt, '-infinity') and a.ctid < b.ctid)
+  );
+
+alter table subject_progress
+    add constraint subject_progress_user_subject_key unique (user_id, subject);
@@ -4,9 +4,11 @@ from typing import List, Dict, Tuple
 import os
 from datetime import datetime
 import math
+from taxonomy import Taxonomy, get_taxonomy
+from state_store import StateStore, UserState, create_state_store, default_topic_stats
 
 class AdaptiveLearningSystem:
-    def __init__(self, data_dir: str = None):
+    def __init__(self, data_dir: str = None, state_store: StateStore = None):
         # Get the directory where this file is located (src)
         current_dir = os.path.dirname(os.path.abspath(__file__))
         # Go one level up to the project root
@@ -21,6 +23,9 @@ class AdaptiveLearningSystem:
         self.state_dir = os.path.join(data_dir, 'adaptive_state')
         os.makedirs(self.state_dir, exist_ok=True)
         
+        # Per-user state backend (SQLite by default, see ADAPTIVE_STATE_BACKEND)
+        self.state_store = state_store or create_state_store(data_dir)
+        
         # Create data directories if they don't exist
         os.makedirs(os.path.join(data_dir, 'raw'), exist_ok=True)
         os.makedirs(os.path.join(data_dir, 'processed'), exist_ok=True)
@@ -36,132 +41,124 @@ class AdaptiveLearningSystem:
         }
         
     def load_data(self):
-        """Load topics data from file."""
+        """Load topics data from the shared taxonomy (re-read only when topics.json changes)."""
         try:
-            with open(self.topics_path, 'r', encoding='utf-8') as f:
-                self.topics_data = json.load(f)
-            print(f"Available subjects: {[topic['title'] for topic in self.topics_data.get('topics', [])]}")
+            self.taxonomy = get_taxonomy(self.topics_path)
         except Exception as e:
             print(f"Error loading topics data: {str(e)}")
-            self.topics_data = {'topics': []}
+            self.taxonomy = Taxonomy({'topics': []})
+    
+    @property
+    def topics_data(self) -> Dict:
+        """Read-only topics document."""
+        return self.taxonomy.data
 
     def clear_user_state(self, user_id: str):
         """Clear the user's learning state."""
         try:
-            state_path = os.path.join(self.state_dir, f'user_{user_id}_state.json')
-            if os.path.exists(state_path):
-                os.remove(state_path)
-                print(f"Cleared user state for user {user_id}")
+            self.state_store.delete(user_id)
+            print(f"Cleared user state for user {user_id}")
             return self.get_user_state(user_id)  # Return fresh state
         except Exception as e:
             print(f"Error clearing user state: {str(e)}")
             return None
 
-    def get_user_state(self, user_id: str) -> Dict:
+    def get_user_state(self, user_id: str) -> UserState:
         """Get or create user's learning state."""
-        state_path = os.path.join(self.state_dir, f'user_{user_id}_state.json')
-        
-        if os.path.exists(state_path):
-            with open(state_path, 'r') as f:
-                return json.load(f)
-        
-        # Initialize new user state
-        initial_state = {
-            'user_id': user_id,
-            'topic_scores': {},
-            'questions_answered': [],
-            'learning_path': [],
-            'current_level': 1,
-            'timestamp': datetime.now().isoformat()
-        }
+        stored = self.state_store.load(user_id)
         
-        # Initialize scores for all topics with difficulty levels
-        for topic in self.topics_data.get('topics', []):
-            for subtopic in topic.get('subtopics', []):
-                topic_key = f"{topic['title']} - {subtopic['title']}"
-                initial_state['topic_scores'][topic_key] = {
-                    'score': 0.0,
-                    'attempts': 0,
-                    'correct': 0,
-                    'last_attempt': None,
-                    'difficulty_level': 'beginner',
-                    'mastered': False,
-                    'subtopics': {}
-                }
+        if stored is None:
+            # Initialize new user state; it is only written once something changes
+            state = UserState({
+                'user_id': user_id,
+                'topic_scores': {},
+                'questions_answered': [],
+                'learning_path': [],
+                'current_level': 1,
+                'timestamp': datetime.now().isoformat()
+            }, persisted=False)
+            self._add_missing_topics(state)
+            return state
         
-        self.save_user_state(user_id, initial_state)
-        return initial_state
+        # States created by single-topic updates only hold the topics touched so far
+        state = UserState(stored)
+        state.setdefault('questions_answered', [])
+        state.setdefault('learning_path', [])
+        state.setdefault('current_level', 1)
+        state.setdefault('timestamp', None)
+        self._add_missing_topics(state)
+        return state
+    
+    def _add_missing_topics(self, state: Dict):
+        """Initialize scores for all taxonomy topics not yet in the state."""
+        for topic_key in self.taxonomy.topic_keys():
+            if topic_key not in state['topic_scores']:
+                state['topic_scores'][topic_key] = default_topic_stats()
     
     def save_user_state(self, user_id: str, state: Dict):
-        """Save user's learning state to file."""
-        state_path = os.path.join(self.state_dir, f'user_{user_id}_state.json')
-        with open(state_path, 'w') as f:
-            json.dump(state, f, indent=2)
+        """Save user's learning state to the state store, skipping unchanged state."""
+        if not isinstance(state, UserState):
+            self.state_store.save(user_id, state)
+            return
+        if not state.is_dirty:
+            return
+        
+        # Default topic entries of a never-persisted state don't need writing
+        topics = None if 'topic_scores' in state.dirty_fields else state.dirty_topics
+        self.state_store.save(user_id, state, topics=topics)
+        state.mark_clean()
     
     def update_topic_score(self, user_id: str, topic: str, correct: bool, time_taken: float):
         """Update user's score and difficulty level for a topic."""
-        state = self.get_user_state(user_id)
-        
         # Split topic to get subject
         subject = topic.split(' - ')[0]
         
-        # Update subject state if not exists
-        if subject not in state['topic_scores']:
-            state['topic_scores'][subject] = {
-                'score': 0.0,
-                'attempts': 0,
-                'correct': 0,
-                'last_attempt': None,
-                'difficulty_level': 'beginner',
-                'mastered': False,
-                'subtopics': {}
-            }
-        
-        subject_state = state['topic_scores'][subject]
-        
-        # Update statistics
-        subject_state['attempts'] += 1
-        if correct:
-            subject_state['correct'] += 1
-        
-        # Calculate new score (percentage correct)
-        new_score = correct  # This is already a percentage from the frontend
-        
-        # Apply exponential moving average
-        alpha = 0.3
-        subject_state['score'] = alpha * new_score + (1 - alpha) * subject_state['score']
-        subject_state['last_attempt'] = datetime.now().isoformat()
-        
-        # Update difficulty level based on score
-        current_level = subject_state['difficulty_level']
-        threshold = self.difficulty_levels[current_level]
-        difficulty_changed = False
-        
-        if new_score >= threshold:
-            if current_level == 'beginner':
-                subject_state['difficulty_level'] = 'intermediate'
-                difficulty_changed = True
-            elif current_level == 'intermediate':
-                subject_state['difficulty_level'] = 'advanced'
-                difficulty_changed = True
-            elif current_level == 'advanced':
-                subject_state['mastered'] = True
-                difficulty_changed = True
+        def apply(subject_state: Dict) -> Dict:
+            # Update statistics
+            subject_state['attempts'] += 1
+            if correct:
+                subject_state['correct'] += 1
+            
+            # Calculate new score (percentage correct)
+            new_score = correct  # This is already a percentage from the frontend
+            
+            # Apply exponential moving average
+            alpha = 0.3
+            subject_state['score'] = alpha * new_score + (1 - alpha) * subject_state['score']
+            subject_state['last_attempt'] = datetime.now().isoformat()
             
-            if difficulty_changed:
-                # Reset score when advancing to next level
-                subject_state['score'] = 0.0
-                subject_state['correct'] = 0
-                subject_state['attempts'] = 0
+            # Update difficulty level based on score
+            current_level = subject_state['difficulty_level']
+            threshold = self.difficulty_levels[current_level]
+            difficulty_changed = False
+            
+            if new_score >= threshold:
+                if current_level == 'beginner':
+                    subject_state['difficulty_level'] = 'intermediate'
+                    difficulty_changed = True
+                elif current_level == 'intermediate':
+                    subject_state['difficulty_level'] = 'advanced'
+                    difficulty_changed = True
+                elif current_level == 'advanced':
+                    subject_state['mastered'] = True
+                    difficulty_changed = True
+                
+                if difficulty_changed:
+                    # Reset score when advancing to next level
+                    subject_state['score'] = 0.0
+                    subject_state['correct'] = 0
+                    subject_state['attempts'] = 0
+            
+            return {
+                'score': new_score,
+                'current_difficulty': subject_state['difficulty_level'],
+                'threshold_met': new_score >= threshold,
+                'threshold': threshold,
+                'difficulty_changed': difficulty_changed
+            }
         
-        self.save_user_state(user_id, state)
-        return {
-            'score': new_score,
-            'current_difficulty': subject_state['difficulty_level'],
-            'threshold_met': new_score >= threshold,
-            'threshold': threshold,
-            'difficulty_changed': difficulty_changed
-        }
+        # Read-modify-write of the single topic entry, atomic in the store
+        return self.state_store.update_topic(user_id, subject, apply)
     
     def get_topic_recommendations(self, user_id: str, n: int = 3) -> List[str]:
         """Get recommended topics for the user based on their performance."""
@@ -186,10 +183,109 @@ class AdaptiveLearningSystem:
             
             priorities.append((topic, priority))
         
-        # Sort by priority and return top N topics
-        priorities.sort(key=lambda x: x[1], reverse=True)
+        # Sort by priority and return top N topics; equal priorities go by
+        # topic name, the same order as get_topic_recommendations_bulk
+        priorities.sort(key=lambda x: (-x[1], x[0]))
         return [topic for topic, _ in priorities[:n]]
-    
+
+    def get_topic_recommendations_bulk(self, user_ids: List[str], n: int = 3,
+                                       chunk_size: int = 5000) -> Dict[str, List[str]]:
+        """
+        Recommended topics for many users at once (e.g. a nightly precompute).
+
+        Uses the same priority formula and tie-break (topic name) as
+        get_topic_recommendations, evaluated on users x topics arrays.
+        """
+        user_ids = list(user_ids)
+        now = np.datetime64(datetime.now(), 'us')
+        recommendations = {}
+        for start in range(0, len(user_ids), chunk_size):
+            chunk = user_ids[start:start + chunk_size]
+            states = self.state_store.load_many(chunk)
+            recommendations.update(self._recommend_chunk(chunk, states, n, now))
+        return recommendations
+
+    def _recommend_chunk(self, user_ids: List[str], states: Dict[str, Dict], n: int,
+                         now: np.datetime64) -> Dict[str, List[str]]:
+        # Columns: every taxonomy topic (defaulted for all users), then any
+        # other keys found in stored states (present only for those users)
+        topics = list(self.taxonomy.topic_keys())
+        num_defaulted = len(topics)
+        column = {topic: i for i, topic in enumerate(topics)}
+        for state in states.values():
+            for topic in state['topic_scores']:
+                if topic not in column:
+                    column[topic] = len(topics)
+                    topics.append(topic)
+        if not topics or n <= 0:
+            return {user_id: [] for user_id in user_ids}
+
+        shape = (len(user_ids), len(topics))
+        scores = np.zeros(shape)
+        attempts = np.zeros(shape, dtype=np.int64)
+        last_attempts = np.full(shape, None, dtype=object)
+        present = np.zeros(shape, dtype=bool)
+        present[:, :num_defaulted] = True
+
+        for row, user_id in enumerate(user_ids):
+            state = states.get(user_id)
+            if state is None:
+                continue
+            for topic, stats in state['topic_scores'].items():
+                col = column[topic]
+                scores[row, col] = stats['score']
+                attempts[row, col] = stats['attempts']
+                last_attempts[row, col] = stats['last_attempt'] or None
+                present[row, col] = True
+
+        # Parse all timestamps in one pass; missing ones become NaT
+        last_attempts = last_attempts.astype('datetime64[us]')
+        attempted = ~np.isnat(last_attempts)
+        days_since = (now - np.where(attempted, last_attempts, now)) // np.timedelta64(1, 'D')
+
+        priorities = 1 - scores
+        priorities = np.where(attempts == 0, priorities * 1.2, priorities)
+        priorities = np.where(attempted, priorities * (1 + 0.1 * days_since), priorities)
+        priorities[~present] = -np.inf
+
+        name_rank = np.empty(len(topics), dtype=np.int64)
+        name_rank[np.argsort(np.array(topics, dtype=object), kind='stable')] = np.arange(len(topics))
+
+        # Top-k candidates with argpartition, widened to every topic tied with
+        # the k-th priority, so the cut-off falls the same way as in the
+        # single-user path; only that slice is sorted
+        k = min(n, len(topics))
+        kth = -np.partition(-priorities, k - 1, axis=1)[:, k - 1]
+        width = int((priorities >= kth[:, None]).sum(axis=1).max())
+        if width < len(topics):
+            candidates = np.argpartition(-priorities, width - 1, axis=1)[:, :width]
+        else:
+            candidates = np.broadcast_to(np.arange(len(topics)), shape)
+        candidate_priorities = np.take_along_axis(priorities, candidates, axis=1)
+        # Order by priority (descending), then by topic name
+        order = np.lexsort((name_rank[candidates], -candidate_priorities), axis=1)[:, :k]
+        top = np.take_along_axis(candidates, order, axis=1)
+        top_priorities = np.take_along_axis(candidate_priorities, order, axis=1)
+
+        return {
+            user_id: [topics[col] for col, priority in zip(top[row], top_priorities[row])
+                      if priority != -np.inf]
+            for row, user_id in enumerate(user_ids)
+        }
+
+    def recommendation_mismatches(self, user_ids: List[str], n: int = 3) -> Dict[str, Tuple[List[str], List[str]]]:
+        """
+        Users whose bulk recommendations differ from the single-user ones,
+        as {user_id: (single, bulk)}; empty when both paths agree.
+        """
+        bulk = self.get_topic_recommendations_bulk(user_ids, n=n)
+        mismatches = {}
+        for user_id in user_ids:
+            single = self.get_topic_recommendations(user_id, n=n)
+            if single != bulk.get(user_id):
+                mismatches[user_id] = (single, bulk.get(user_id))
+        return mismatches
+
     def get_questions_for_topic(self, topic: str, n: int = 5) -> List[Dict]:
         """This method is deprecated as we now generate questions using the API."""
         return []  # Return empty list as questions are generated via API
@@ -200,8 +296,8 @@ class AdaptiveLearningSystem:
         
         # Group topics by main subject and difficulty
         topics_by_subject = {}
-        for topic in self.topics_data['topics']:
-            subject = topic['title']
+        for subject_entry in self.taxonomy.subjects:
+            subject = subject_entry.title
             if subject not in topics_by_subject:
                 topics_by_subject[subject] = {
                     'beginner': [],
@@ -210,8 +306,8 @@ class AdaptiveLearningSystem:
                 }
             
             # Get subject progress from state
-            for subtopic in topic['subtopics']:
-                topic_key = f"{subject} - {subtopic['title']}"
+            for subtopic in subject_entry.subtopics:
+                topic_key = subtopic.key
                 stats = state['topic_scores'].get(topic_key, {
                     'score': 0.0,
                     'attempts': 0,
@@ -235,8 +331,8 @@ class AdaptiveLearningSystem:
                     
                     learning_path.append({
                         'topic': topic_key,
-                        'key_points': subtopic['key_points'],
-                        'examples': subtopic.get('examples', []),
+                        'key_points': list(subtopic.key_points),
+                        'examples': list(subtopic.examples),
                         'current_score': stats['score'],
                         'difficulty_level': stats['difficulty_level'],
                         'attempts': stats['attempts']
@@ -250,6 +346,7 @@ class AdaptiveLearningSystem:
         # Limit to 8 topics
         learning_path = learning_path[:8]
         
+        # Only marks the state dirty (and so written) if the path changed
         state['learning_path'] = learning_path
         self.save_user_state(user_id, state)
         return learning_path
@@ -306,6 +403,10 @@ def main():
             time_taken = np.random.uniform(30, 180)  # Random time between 30s and 3m
             adaptive_system.update_topic_score(user_id, topic['topic'], correct, time_taken)
     
+    # The bulk precompute must agree with the per-request recommendations
+    mismatches = adaptive_system.recommendation_mismatches([user_id, "test_user_new"])
+    print(f"Recommendation parity: {'ok' if not mismatches else mismatches}")
+    
     # Get progress report
     progress = adaptive_system.get_progress_report(user_id)
     print("\nProgress Report:")
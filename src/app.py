@@ -1,7 +1,14 @@
-from flask import Flask, render_template, request, jsonify, session, url_for, flash, redirect
+from flask import Flask, render_template, request, jsonify, session, url_for, flash, redirect, Response
 from adaptive_learning import AdaptiveLearningSystem
 from question_generation import QuestionGenerator
 from database import db  # Import our database class
+from event_loop import background_loop
+from mock_generator import question_inventory
+from question_bank import mock_question_bank, diagram_question_bank
+from llm_client import llm_client
+from llm_policy import policy_stats
+from prompts import template_stats
+from stored_tests import test_store
 import os
 from datetime import datetime
 import json
@@ -22,11 +29,21 @@ app.secret_key = os.urandom(24)
 adaptive_system = AdaptiveLearningSystem()
 question_generator = QuestionGenerator()
 
+# Keep the advanced mock question inventory topped up in the background
+if os.getenv('QUESTION_INVENTORY_REFILL', '1') == '1':
+    question_inventory.start()
+
+# 'persistent' runs async routes on one shared event loop so clients and
+# connection pools survive across requests; 'per_request' uses asyncio.run
+ASYNC_ROUTE_MODE = os.getenv('ASYNC_ROUTE_MODE', 'persistent')
+
 def async_route(f):
     """Decorator to handle async routes."""
     @wraps(f)
     def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
+        if ASYNC_ROUTE_MODE == 'per_request':
+            return asyncio.run(f(*args, **kwargs))
+        return background_loop.run(f(*args, **kwargs))
     wrapper.__name__ = f.__name__
     return wrapper
 
@@ -136,7 +153,7 @@ def index():
         return render_template('landing.html')
 
     try:
-        # Reload topics data and clear user state
+        # Pick up topics.json edits (only re-parsed when its mtime changes)
         adaptive_system.load_data()
         
         # Get user's progress from database
@@ -152,8 +169,8 @@ def index():
         subjects_data = {}
         
         # First, initialize all subjects from topics with default values
-        for topic in adaptive_system.topics_data.get('topics', []):
-            subjects_data[topic['title']] = {
+        for subject_entry in adaptive_system.taxonomy.subjects:
+            subjects_data[subject_entry.title] = {
                 'difficulty_level': 'beginner',
                 'score': 0,
                 'mastered': False,
@@ -162,9 +179,9 @@ def index():
                 'subtopics': []
             }
             # Add subtopics
-            for subtopic in topic.get('subtopics', []):
-                subjects_data[topic['title']]['subtopics'].append({
-                    'title': subtopic['title'],
+            for subtopic in subject_entry.subtopics:
+                subjects_data[subject_entry.title]['subtopics'].append({
+                    'title': subtopic.title,
                     'score': 0,
                     'difficulty_level': 'beginner',
                     'mastered': False
@@ -182,25 +199,23 @@ def index():
                         'last_attempt': subject_progress.get('last_attempt')
                     })
         
-        # Add test history to each subject
-        for subject in subjects_data:
-            history_result = db.get_test_history(
-                user_id=session['user_id'],
-                subject=subject,
-                limit=10
-            )
-            if hasattr(history_result, 'data'):
-                history_data = history_result.data
-                if history_data:
-                    subjects_data[subject]['history'] = [
-                        {
-                            'attempt_number': idx + 1,
-                            'score': round(item['score'] * 100, 1),
-                            'date': item['test_date'],
-                            'difficulty_level': item['difficulty_level']
-                        }
-                        for idx, item in enumerate(history_data)
-                    ]
+        # Add test history to each subject (one query for all subjects)
+        history_by_subject = db.get_recent_test_history(
+            user_id=session['user_id'],
+            subjects=list(subjects_data.keys()),
+            limit=10
+        )
+        for subject, history_data in history_by_subject.items():
+            if subject in subjects_data:
+                subjects_data[subject]['history'] = [
+                    {
+                        'attempt_number': idx + 1,
+                        'score': round(item['score'] * 100, 1),
+                        'date': item['test_date'],
+                        'difficulty_level': item['difficulty_level']
+                    }
+                    for idx, item in enumerate(history_data)
+                ]
         
         return render_template('index.html',
                              learning_path=learning_path,
@@ -212,6 +227,46 @@ def index():
         flash("An error occurred while loading your progress. Please try again.", "error")
         return render_template('error.html', error=str(e))
 
+# Stream topic questions to the page as they are generated instead of
+# rendering only after the whole response has arrived
+TOPIC_STREAMING = os.getenv('TOPIC_STREAMING', '1') == '1'
+# Shuffle options per user, so students sharing a coalesced generation see different orders
+TOPIC_SHUFFLE_OPTIONS = os.getenv('TOPIC_SHUFFLE_OPTIONS', '1') == '1'
+
+def get_current_difficulty(user_id, subject):
+    """Current difficulty level of a user for a subject."""
+    progress_result = db.get_user_progress(user_id)
+    if hasattr(progress_result, 'data'):
+        for item in progress_result.data:
+            if isinstance(item, dict) and item.get('subject') == subject:
+                return item.get('difficulty_level', 'beginner')
+    return 'beginner'
+
+def generation_error_message(e):
+    """User-facing message for a question generation failure."""
+    if "Invalid JSON response" in str(e):
+        return "The question generation service returned an invalid response. Please try again."
+    if "No valid questions found" in str(e):
+        return "Could not generate valid questions. Please try again."
+    if "API call failed" in str(e):
+        return "Could not connect to the question generation service. Please try again later."
+    return "Question generation failed. Please try again later."
+
+def start_stored_test(topic, difficulty_level, questions):
+    """Store a new test server-side, replacing the session's previous one; returns (test_id, test)."""
+    previous_test_id = session.pop('current_test_id', None)
+    if previous_test_id:
+        test_store.delete(previous_test_id)
+    test = {
+        'user_id': session['user_id'],
+        'topic': topic,
+        'questions': questions,
+        'difficulty_level': difficulty_level,
+        'start_time': datetime.now().isoformat()
+    }
+    session['current_test_id'] = test_store.create(test)
+    return session['current_test_id'], test
+
 @app.route('/start_topic/<topic>')
 @async_route
 async def start_topic(topic):
@@ -223,23 +278,26 @@ async def start_topic(topic):
         # Get subject from topic string
         subject = topic.split(' - ')[0]
         
-        # Get user's current progress from database
-        progress_result = db.get_user_progress(session['user_id'])
-        current_difficulty = 'beginner'  # default
+        # Get user's current difficulty level for the subject; the Supabase
+        # call is blocking, so it runs off the shared event loop
+        current_difficulty = await asyncio.to_thread(get_current_difficulty, session['user_id'], subject)
         
-        # Find current difficulty level for the subject
-        if hasattr(progress_result, 'data'):
-            for item in progress_result.data:
-                if isinstance(item, dict) and item.get('subject') == subject:
-                    current_difficulty = item.get('difficulty_level', 'beginner')
-                    break
+        if TOPIC_STREAMING and request.args.get('stream') != '0':
+            # Render the page right away; it loads questions from stream_topic_questions
+            return render_template('topic.html',
+                                topic=topic,
+                                subject=subject,
+                                questions=None,
+                                stream_url=url_for('stream_topic_questions', topic=topic),
+                                difficulty_level=current_difficulty)
         
         try:
             # Generate questions
             questions = await question_generator.generate_questions_for_topic(
                 topic=topic,
                 num_questions=10,
-                difficulty_level=current_difficulty
+                difficulty_level=current_difficulty,
+                shuffle_seed=session['user_id'] if TOPIC_SHUFFLE_OPTIONS else None
             )
             
             if not questions:
@@ -250,13 +308,8 @@ async def start_topic(topic):
                                     error="No questions were generated. Please try again.",
                                     difficulty_level=current_difficulty)
             
-            # Store questions in session for validation
-            session['current_test'] = {
-                'topic': topic,
-                'questions': questions,
-                'difficulty_level': current_difficulty,
-                'start_time': datetime.now().isoformat()
-            }
+            # Keep the questions server-side for grading; the session only gets the id
+            start_stored_test(topic, current_difficulty, questions)
             
             return render_template('topic.html',
                                 topic=topic,
@@ -266,14 +319,7 @@ async def start_topic(topic):
             
         except Exception as e:
             app.logger.error(f"Question generation failed: {str(e)}")
-            error_message = "Question generation failed. Please try again later."
-            
-            if "Invalid JSON response" in str(e):
-                error_message = "The question generation service returned an invalid response. Please try again."
-            elif "No valid questions found" in str(e):
-                error_message = "Could not generate valid questions. Please try again."
-            elif "API call failed" in str(e):
-                error_message = "Could not connect to the question generation service. Please try again later."
+            error_message = generation_error_message(e)
             
             return render_template('topic.html',
                                 topic=topic,
@@ -286,74 +332,83 @@ async def start_topic(topic):
         app.logger.error(f"Error in start_topic route: {str(e)}")
         return render_template('error.html', error="An unexpected error occurred. Please try again later.")
 
+@app.route('/api/stream_topic_questions/<topic>')
+@login_required
+def stream_topic_questions(topic):
+    """Stream topic questions as NDJSON, one line per question as soon as it is generated."""
+    subject = topic.split(' - ')[0]
+    difficulty_level = get_current_difficulty(session['user_id'], subject)
+    
+    # Create the test before streaming so the session cookie carries its id;
+    # questions are added to the stored test as they arrive
+    test_id, test = start_stored_test(topic, difficulty_level, [])
+    shuffle_seed = session['user_id'] if TOPIC_SHUFFLE_OPTIONS else None
+    
+    def generate():
+        try:
+            questions = question_generator.stream_questions_for_topic(
+                topic=topic,
+                num_questions=10,
+                difficulty_level=difficulty_level,
+                shuffle_seed=shuffle_seed
+            )
+            for question in background_loop.iterate(questions):
+                test['questions'].append(question)
+                test_store.put(test_id, test)
+                yield json.dumps({'question': question}) + '\n'
+            yield json.dumps({'done': True, 'count': len(test['questions'])}) + '\n'
+        except Exception as e:
+            app.logger.error(f"Question generation failed: {str(e)}")
+            yield json.dumps({'error': generation_error_message(e)}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/submit_answer', methods=['POST'])
 def submit_answer():
     """Handle answer submission and update progress."""
     try:
         data = request.get_json()
-        subject = data.get('subject')
-        score = data.get('total_correct') / data.get('num_questions')
         time_taken = data.get('time_taken', 0)
-        num_questions = data.get('num_questions', 0)
-        total_correct = data.get('total_correct', 0)
 
-        # Get current difficulty level
-        progress_result = db.get_user_progress(session['user_id'])
-        current_difficulty = 'beginner'
-        
-        # Extract data from Supabase response
-        progress_data = progress_result.data if hasattr(progress_result, 'data') else []
-        
-        # Find current difficulty level for the subject
-        for item in progress_data:
-            if isinstance(item, dict) and item.get('subject') == subject:
-                current_difficulty = item.get('difficulty_level', 'beginner')
-                break
+        # Grade against the stored questions; client-reported counts are never trusted
+        test_id = session.pop('current_test_id', None)
+        test = test_store.get(test_id) if test_id else None
+        if test is None or test.get('user_id') != session['user_id']:
+            return jsonify({
+                'error': 'This test has expired or was already submitted. Please start the topic again.'
+            }), 410
+        test_store.delete(test_id)
+        answers = data.get('answers', [])
+        questions = test['questions']
+        subject = test['topic'].split(' - ')[0]
+        num_questions = len(questions)
+        total_correct = sum(
+            1 for question, answer in zip(questions, answers)
+            if answer is not None and answer == question.get('correct_answer')
+        )
+        if not num_questions:
+            return jsonify({'error': 'No questions were answered'}), 400
+        score = total_correct / num_questions
 
-        # Store test result
-        db.add_test_result(
+        # Store the result and update progress in one round trip
+        attempt = db.record_attempt(
             user_id=session['user_id'],
             subject=subject,
             score=score,
-            difficulty_level=current_difficulty,
             time_taken=time_taken,
             num_questions=num_questions,
             correct_answers=total_correct
         )
 
-        # Check if score meets advancement criteria
-        if score >= 0.7:  # 70% or higher
-            new_difficulty = {
-                'beginner': 'intermediate',
-                'intermediate': 'advanced',
-                'advanced': 'advanced'
-            }.get(current_difficulty, 'beginner')
-
-            if new_difficulty != current_difficulty:
-                # Update difficulty level without resetting score
-                db.update_subject_progress(
-                    user_id=session['user_id'],
-                    subject=subject,
-                    score=score,  # Keep the score that achieved advancement
-                    difficulty_level=new_difficulty,
-                    mastered=(new_difficulty == 'advanced')
-                )
-                
-                return jsonify({
-                    'score': score,
-                    'difficulty_changed': True,
-                    'new_difficulty': new_difficulty,
-                    'message': f'Congratulations! You\'ve advanced to {new_difficulty} level! Get ready for more challenging questions.'
-                })
-        else:
-            # Update progress without changing difficulty
-            db.update_subject_progress(
-                user_id=session['user_id'],
-                subject=subject,
-                score=score,
-                difficulty_level=current_difficulty,
-                mastered=False
-            )
+        if attempt['difficulty_changed']:
+            new_difficulty = attempt['difficulty_level']
+            return jsonify({
+                'score': score,
+                'difficulty_changed': True,
+                'new_difficulty': new_difficulty,
+                'message': f'Congratulations! You\'ve advanced to {new_difficulty} level! Get ready for more challenging questions.'
+            })
 
         return jsonify({
             'score': score,
@@ -390,35 +445,61 @@ def mock_test():
 async def get_mock_questions():
     """Get questions for mock test from all subjects."""
     try:
-        # Import mock_generator functionality
-        from mock_generator import (
-            get_aptitude_questions,
-            get_math_questions,
-            get_digital_logic_questions,
-            get_computer_networks_questions,
-            get_machine_learning_questions,
-            get_software_engineering_questions,
-            get_cloud_computing_questions,
-            get_cybersecurity_questions
-        )
+        from mock_generator import assemble_mock_test
         
-        # Get questions from each subject sequentially
-        all_questions = (
-            await get_aptitude_questions() +
-            await get_math_questions() +
-            await get_digital_logic_questions() +
-            await get_computer_networks_questions() +
-            await get_machine_learning_questions() +
-            await get_software_engineering_questions() +
-            await get_cloud_computing_questions() +
-            await get_cybersecurity_questions()
-        )
+        # Load all subjects concurrently, each under its own deadline
+        all_questions, timings = await assemble_mock_test()
+        app.logger.info(f"Mock test assembled: {timings}")
         
-        return jsonify(all_questions)
+        response = jsonify(all_questions)
+        # Expose per-subject timings to the browser dev tools
+        response.headers['Server-Timing'] = ', '.join(
+            f'subject{idx};desc="{subject}";dur={timing["seconds"] * 1000:.0f}'
+            for idx, (subject, timing) in enumerate(timings.items())
+        )
+        return response
     except Exception as e:
         app.logger.error(f"Error getting mock questions: {str(e)}")
         return jsonify({'error': 'Failed to load questions'}), 500
 
+@app.route('/api/stream_mock_questions')
+@login_required
+def stream_mock_questions():
+    """Stream mock test sections as NDJSON, one line per subject in section order, then a done line."""
+    from mock_generator import iter_mock_sections
+    
+    def generate():
+        timings = {}
+        try:
+            for subject, questions, timing in background_loop.iterate(iter_mock_sections()):
+                timings[subject] = timing
+                yield json.dumps({'subject': subject, 'questions': questions}) + '\n'
+            app.logger.info(f"Mock test streamed: {timings}")
+            yield json.dumps({'done': True, 'timings': timings}) + '\n'
+        except Exception as e:
+            app.logger.error(f"Error streaming mock questions: {str(e)}")
+            yield json.dumps({'error': 'Failed to load questions'}) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/stats')
+@login_required
+def get_stats():
+    """Report internal cache and inventory statistics."""
+    return jsonify({
+        'llm_client': llm_client.stats(),
+        'question_generation': question_generator.stats(),
+        'llm_policies': policy_stats(),
+        'prompts': template_stats(),
+        'question_inventory': question_inventory.stats(),
+        'test_store': test_store.stats(),
+        'question_banks': {
+            'mock_questions': mock_question_bank.stats(),
+            'diagram_questions': diagram_question_bank.stats()
+        }
+    })
+
 @app.route('/api/submit_mock_answers', methods=['POST'])
 @login_required
 def submit_mock_answers():
@@ -505,5 +586,5 @@ if __name__ == '__main__':
     os.makedirs(os.path.join(project_root, 'templates'), exist_ok=True)
     os.makedirs(os.path.join(project_root, 'static'), exist_ok=True)
     
-    # Run the app in debug mode
-    app.run(debug=True) 
\ No newline at end of file
+    # Run the app in debug mode (threaded so async routes overlap on the shared loop)
+    app.run(debug=True, threaded=True) 
\ No newline at end of file
@@ -0,0 +1,169 @@
+# src/bank_report.py
+import argparse
+import hashlib
+import json
+from collections import Counter
+from typing import Dict, Iterable, Optional
+from question_bank import iter_rows
+
+# Fields that make up a question's content (ids and timestamps differ per environment)
+CONTENT_FIELDS = ('subject', 'question_type', 'question', 'options', 'correct_answer', 'explanation', 'svg_code')
+REQUIRED_FIELDS = ('subject', 'question', 'options', 'correct_answer', 'explanation')
+# Problem rows listed per issue in the report
+MAX_EXAMPLE_IDS = 20
+
+
+def row_digest(row: Dict) -> int:
+    """Hash of a row's content, independent of key order and row id."""
+    content = {field: row.get(field) for field in CONTENT_FIELDS if field in row}
+    canonical = json.dumps(content, sort_keys=True, ensure_ascii=False)
+    return int.from_bytes(hashlib.sha256(canonical.encode('utf-8')).digest(), 'big')
+
+
+def row_problems(row: Dict, has_svg: bool):
+    """Yield the names of the integrity problems found in a row."""
+    for field in REQUIRED_FIELDS:
+        if row.get(field) in (None, '', []):
+            yield f'null_{field}'
+
+    options = row.get('options')
+    if options is not None and not isinstance(options, list):
+        yield 'malformed_options'
+    elif isinstance(options, list) and len(options) < 2:
+        yield 'too_few_options'
+
+    answer = row.get('correct_answer')
+    if answer is not None and isinstance(options, list):
+        if not isinstance(answer, int) or isinstance(answer, bool) or not 0 <= answer < len(options):
+            yield 'correct_answer_out_of_range'
+
+    if has_svg:
+        svg = row.get('svg_code')
+        if svg in (None, ''):
+            yield 'null_svg_code'
+        elif '<svg' not in svg or '</svg>' not in svg:
+            yield 'malformed_svg_code'
+
+
+def build_report(table: str, rows: Optional[Iterable[Dict]] = None) -> Dict:
+    """
+    Statistics and integrity report for a question table in one pass.
+
+    Per subject: question count, counts per question type, option-count
+    histogram, problem counts and an order-independent content checksum.
+    Matching checksums mean two environments hold the same questions.
+    """
+    if rows is None:
+        rows = iter_rows(table, '*')
+
+    subjects: Dict[str, Dict] = {}
+    digests: Dict[str, int] = {}
+    problems = Counter()
+    examples: Dict[str, list] = {}
+    total = 0
+    for row in rows:
+        total += 1
+        subject = row.get('subject') or '(none)'
+        entry = subjects.get(subject)
+        if entry is None:
+            entry = subjects[subject] = {
+                'count': 0,
+                'types': Counter(),
+                'option_counts': Counter(),
+                'problems': Counter()
+            }
+            digests[subject] = 0
+        entry['count'] += 1
+        entry['types'][row.get('question_type') or ('diagram' if 'svg_code' in row else 'unknown')] += 1
+        options = row.get('options')
+        entry['option_counts'][len(options) if isinstance(options, list) else 'invalid'] += 1
+
+        for problem in row_problems(row, 'svg_code' in row):
+            entry['problems'][problem] += 1
+            problems[problem] += 1
+            ids = examples.setdefault(problem, [])
+            if len(ids) < MAX_EXAMPLE_IDS:
+                ids.append(row.get('id'))
+
+        # Summing digests makes the checksum independent of row order
+        digests[subject] = (digests[subject] + row_digest(row)) % (1 << 256)
+
+    checksums = {subject: f'{digest:064x}' for subject, digest in digests.items()}
+    overall = hashlib.sha256(
+        json.dumps(sorted(checksums.items())).encode('utf-8')
+    ).hexdigest()
+    return {
+        'table': table,
+        'total': total,
+        'checksum': overall,
+        'problems': dict(problems),
+        'problem_examples': examples,
+        'subjects': {
+            subject: {
+                'count': entry['count'],
+                'types': dict(entry['types']),
+                'option_counts': {str(k): v for k, v in sorted(entry['option_counts'].items(), key=str)},
+                'problems': dict(entry['problems']),
+                'checksum': checksums[subject]
+            }
+            for subject, entry in sorted(subjects.items())
+        }
+    }
+
+
+def print_report(report: Dict):
+    print(f"\nTotal questions in {report['table']}: {report['total']}")
+    print("\nBreakdown by subject:")
+    for subject, entry in report['subjects'].items():
+        types = ', '.join(f"{t}: {n}" for t, n in entry['types'].items())
+        options = ', '.join(f"{k}: {v}" for k, v in entry['option_counts'].items())
+        print(f"{subject}: {entry['count']} questions ({types}); options {{{options}}}; "
+              f"checksum {entry['checksum'][:12]}")
+
+    if report['problems']:
+        print("\nIntegrity problems:")
+        for problem, count in sorted(report['problems'].items()):
+            ids = ', '.join(str(i) for i in report['problem_examples'].get(problem, []))
+            print(f"  {problem}: {count} (e.g. ids {ids})")
+    else:
+        print("\nNo integrity problems found.")
+    print(f"\nTable checksum: {report['checksum']}")
+
+
+def compare_reports(a: Dict, b: Dict) -> Dict[str, str]:
+    """Subjects whose content differs between two reports, with the reason."""
+    differences = {}
+    for subject in sorted(set(a['subjects']) | set(b['subjects'])):
+        left, right = a['subjects'].get(subject), b['subjects'].get(subject)
+        if left is None or right is None:
+            differences[subject] = 'missing on one side'
+        elif left['checksum'] != right['checksum']:
+            differences[subject] = f"content differs ({left['count']} vs {right['count']} questions)"
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report statistics and integrity of a question table.")
+    parser.add_argument('table', nargs='?', default='mock_questions')
+    parser.add_argument('--json', help="Also write the report to this file")
+    parser.add_argument('--compare', help="Compare against a report saved with --json (e.g. from another environment)")
+    args = parser.parse_args()
+
+    report = build_report(args.table)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            other = json.load(f)
+        differences = compare_reports(report, other)
+        if not differences:
+            print(f"\n{args.table} matches {args.compare}")
+        for subject, reason in differences.items():
+            print(f"\n{subject}: {reason}")
+
+
+if __name__ == "__main__":
+    main()
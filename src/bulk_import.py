@@ -0,0 +1,284 @@
+# src/bulk_import.py
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from database import db
+from dedup import DedupIndex, question_text
+from question_bank import PAGE_SIZE, iter_rows
+
+
+class BulkImporter:
+    """
+    Chunked, parallel and resumable import of question JSON files into a table.
+
+    Rows are inserted in chunks of `chunk_size` by a pool of `max_workers`
+    threads. Every finished chunk is recorded in a checkpoint file, so a
+    rerun after a failure only sends the chunks that are still missing.
+    A file whose contents change starts over from its first chunk.
+
+    With `dedup`, rows that nearly match a question already in the table
+    (according to its stored MinHash signatures) or an earlier row of the
+    same run are skipped. The local signature store is rebuilt from the
+    table first when it does not hold one signature per row (e.g. on a
+    fresh checkout or another host).
+    """
+
+    def __init__(
+        self,
+        table: str,
+        source_dir: str,
+        sources: Dict[str, str],
+        list_key: str,
+        to_row: Callable[[Dict, str], Dict],
+        chunk_size: int = 500,
+        max_workers: int = 4,
+        max_retries: int = 3,
+        checkpoint_path: Optional[str] = None,
+        dedup: bool = True
+    ):
+        self.table = table
+        self.source_dir = source_dir
+        self.sources = sources
+        self.list_key = list_key
+        self.to_row = to_row
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.checkpoint_path = checkpoint_path or os.path.join(
+            source_dir, f'.{table}_import_checkpoint.json'
+        )
+        self.dedup_index = DedupIndex(table) if dedup else None
+        self._lock = threading.Lock()
+        self.checkpoint: Dict[str, Dict] = {}
+
+    def load_checkpoint(self):
+        try:
+            with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                self.checkpoint = json.load(f)
+        except FileNotFoundError:
+            self.checkpoint = {}
+        except Exception as e:
+            print(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {str(e)}")
+            self.checkpoint = {}
+
+    def save_checkpoint(self):
+        """Write the checkpoint atomically (caller holds the lock)."""
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.checkpoint, f, indent=2)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def reset(self):
+        """Forget previous progress so every chunk is imported again."""
+        self.checkpoint = {}
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def _read_source(self, filename: str, subject: str):
+        """Return (fingerprint, rows) for one source file."""
+        filepath = os.path.join(self.source_dir, filename)
+        with open(filepath, 'rb') as f:
+            raw = f.read()
+        data = json.loads(raw.decode('utf-8'))
+        rows = [self.to_row(q, subject) for q in data[self.list_key]]
+        return hashlib.sha256(raw).hexdigest(), rows
+
+    def sync_dedup_index(self):
+        """Rebuild the signature store from the table if their row counts differ."""
+        result = db.client.table(self.table).select('id', count='exact').limit(1).execute()
+        table_rows = result.count or 0
+        indexed = self.dedup_index.count()
+        if indexed == table_rows:
+            return
+        print(f"Dedup index holds {indexed} signature(s) for {table_rows} row(s) in {self.table}; rebuilding")
+        self.dedup_index.rebuild(
+            (str(row['id']), question_text(row))
+            for row in iter_rows(self.table, 'id, question, options')
+        )
+
+    def _count_matching(self, row: Dict) -> int:
+        """Number of rows in the table with this row's subject and question text."""
+        result = db.client.table(self.table)\
+            .select('id', count='exact')\
+            .eq('subject', row['subject'])\
+            .eq('question', row['question'])\
+            .limit(1)\
+            .execute()
+        return result.count or 0
+
+    def _find_inserted(self, rows: List[Dict]) -> List[Dict]:
+        """Look up the stored rows of a chunk whose insert went through unacknowledged."""
+        marker = db.client.table(self.table)\
+            .select('id')\
+            .eq('subject', rows[0]['subject'])\
+            .eq('question', rows[0]['question'])\
+            .order('id', desc=True)\
+            .limit(1)\
+            .execute()
+        # The chunk's ids start at its first row's; match the rest by question text
+        wanted = {}
+        for row in rows:
+            wanted.setdefault(row['question'], []).append(row)
+        found = []
+        start = 0
+        while wanted:
+            page = db.client.table(self.table)\
+                .select('id, question')\
+                .eq('subject', rows[0]['subject'])\
+                .gte('id', marker.data[0]['id'])\
+                .order('id')\
+                .range(start, start + PAGE_SIZE - 1)\
+                .execute().data or []
+            for stored in page:
+                matches = wanted.get(stored['question'])
+                if matches:
+                    found.append({**matches.pop(0), 'id': stored['id']})
+                    if not matches:
+                        del wanted[stored['question']]
+            if len(page) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+        return found
+
+    def _insert_chunk(self, rows: List[Dict]):
+        if not rows:
+            return
+        # Inserts are atomic per request, so the first row tells whether a
+        # failed attempt was actually committed (e.g. the response was lost)
+        existing = self._count_matching(rows[0])
+        for attempt in range(self.max_retries):
+            try:
+                if attempt and self._count_matching(rows[0]) > existing:
+                    inserted = self._find_inserted(rows)
+                else:
+                    result = db.client.table(self.table).insert(rows).execute()
+                    inserted = result.data or []
+                    if len(inserted) != len(rows):
+                        raise Exception(f"inserted {len(inserted)} of {len(rows)} rows")
+                if self.dedup_index is not None:
+                    self.dedup_index.add_many(
+                        (str(row['id']), question_text(row)) for row in inserted
+                    )
+                return
+            except Exception:
+                if attempt == self.max_retries - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def run(self, fresh: bool = False) -> Dict:
+        """Import all sources; returns counts and throughput."""
+        if fresh:
+            self.reset()
+        else:
+            self.load_checkpoint()
+
+        # Collect pending chunks across all files
+        pending = []
+        skipped_rows = 0
+        for filename, subject in self.sources.items():
+            try:
+                fingerprint, rows = self._read_source(filename, subject)
+            except FileNotFoundError:
+                print(f"Warning: File not found for {subject} at {os.path.join(self.source_dir, filename)}")
+                continue
+            except (json.JSONDecodeError, KeyError) as e:
+                print(f"Error parsing JSON for {subject}: {str(e)}")
+                continue
+
+            state = self.checkpoint.get(filename)
+            if state is None or state.get('fingerprint') != fingerprint:
+                state = {'fingerprint': fingerprint, 'chunk_size': self.chunk_size, 'done': []}
+                self.checkpoint[filename] = state
+            # Chunk boundaries must match the ones the checkpoint was written with
+            chunk_size = state['chunk_size']
+            done = set(state['done'])
+
+            print(f"Found {len(rows)} questions for {subject}")
+            for index, start in enumerate(range(0, len(rows), chunk_size)):
+                chunk = rows[start:start + chunk_size]
+                if index in done:
+                    skipped_rows += len(chunk)
+                else:
+                    pending.append((filename, subject, index, chunk))
+
+        if skipped_rows:
+            print(f"Resuming: {skipped_rows} rows already imported according to {self.checkpoint_path}")
+
+        duplicate_rows = 0
+        if self.dedup_index is not None and pending:
+            self.sync_dedup_index()
+            # Chunk boundaries stay fixed for the checkpoint; only their contents shrink
+            accepted, duplicates = self.dedup_index.filter_new(
+                ((p, r), question_text(row))
+                for p, (_, _, _, chunk) in enumerate(pending)
+                for r, row in enumerate(chunk)
+            )
+            accepted = set(accepted)
+            pending = [
+                (filename, subject, index, [row for r, row in enumerate(chunk) if (p, r) in accepted])
+                for p, (filename, subject, index, chunk) in enumerate(pending)
+            ]
+            duplicate_rows = len(duplicates)
+            if duplicate_rows:
+                print(f"Skipping {duplicate_rows} near-duplicate question(s)")
+
+        imported_rows = 0
+        failed_chunks = 0
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._insert_chunk, chunk): (filename, subject, index, chunk)
+                for filename, subject, index, chunk in pending
+            }
+            for future in as_completed(futures):
+                filename, subject, index, chunk = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    failed_chunks += 1
+                    print(f"Error importing chunk {index} of {subject}: {str(e)}")
+                    continue
+
+                with self._lock:
+                    self.checkpoint[filename]['done'].append(index)
+                    self.save_checkpoint()
+                imported_rows += len(chunk)
+                elapsed = time.perf_counter() - started
+                print(f"Imported chunk {index} of {subject} ({imported_rows} rows, "
+                      f"{imported_rows / elapsed:.1f} rows/sec)")
+
+        elapsed = time.perf_counter() - started
+        summary = {
+            'imported_rows': imported_rows,
+            'skipped_rows': skipped_rows,
+            'duplicate_rows': duplicate_rows,
+            'failed_chunks': failed_chunks,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round(imported_rows / elapsed, 1) if elapsed > 0 else None
+        }
+        print(f"Imported {imported_rows} rows into {self.table} in {summary['seconds']}s "
+              f"({summary['rows_per_second']} rows/sec), {failed_chunks} chunk(s) failed")
+        if failed_chunks:
+            print("Rerun to retry the failed chunks; finished chunks will be skipped.")
+        return summary
+
+
+def run_cli(build_importer: Callable[..., BulkImporter], description: str) -> Dict:
+    """Shared command line for the migrate scripts."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--chunk-size', type=int, help="Rows per insert request")
+    parser.add_argument('--workers', type=int, help="Concurrent insert requests")
+    parser.add_argument('--fresh', action='store_true', help="Ignore the checkpoint and import everything")
+    parser.add_argument('--allow-duplicates', action='store_true', help="Skip the near-duplicate check")
+    args = parser.parse_args()
+
+    options = {'chunk_size': args.chunk_size, 'max_workers': args.workers}
+    if args.allow_duplicates:
+        options['dedup'] = False
+    importer = build_importer(**{k: v for k, v in options.items() if v is not None})
+    return importer.run(fresh=args.fresh)
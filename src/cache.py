@@ -0,0 +1,137 @@
+# src/cache.py
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a fixed TTL.
+
+    Entries older than `ttl` but younger than `ttl + stale_ttl` are still
+    served by `get_or_load`, while a background thread refreshes them.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024, stale_ttl: float = 0.0):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stale_ttl = stale_ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # Write counters for keys with a load in flight (and how many loads),
+        # so a load finishing after a set/invalidate doesn't store stale data
+        self._versions: Dict[Hashable, int] = {}
+        self._loads: Dict[Hashable, int] = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _bump(self, key: Hashable):
+        if key in self._versions:
+            self._versions[key] += 1
+
+    def _begin_load(self, key: Hashable) -> int:
+        self._loads[key] = self._loads.get(key, 0) + 1
+        return self._versions.setdefault(key, 0)
+
+    def _end_load(self, key: Hashable, version: int, value: Any = None, loaded: bool = False):
+        """Store a loaded value unless the key was written meanwhile; forget the key's version after its last load."""
+        if loaded and self._versions[key] == version:
+            self._store(key, value)
+        self._loads[key] -= 1
+        if not self._loads[key]:
+            del self._loads[key]
+            del self._versions[key]
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a fresh cached value, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[1] > self.ttl:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, replacing any cached or in-flight one."""
+        with self._lock:
+            self._bump(key)
+            self._store(key, value)
+
+    def invalidate(self, key: Hashable):
+        """Drop a key so the next read goes to the loader."""
+        with self._lock:
+            self._bump(key)
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            for key in self._versions:
+                self._versions[key] += 1
+            self._entries.clear()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Read through the cache, serving stale entries while refreshing."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry[1]
+                if age <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                if age <= self.ttl + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        version = self._begin_load(key)
+                        threading.Thread(
+                            target=self._refresh,
+                            args=(key, loader, version),
+                            daemon=True
+                        ).start()
+                    return entry[0]
+            self.misses += 1
+            version = self._begin_load(key)
+
+        try:
+            value = loader()
+        except Exception:
+            with self._lock:
+                self._end_load(key, version)
+            raise
+        with self._lock:
+            # Skipped if the key was set or invalidated while we were loading
+            self._end_load(key, version, value, loaded=True)
+        return value
+
+    def _refresh(self, key: Hashable, loader: Callable[[], Any], version: int):
+        value = None
+        loaded = False
+        try:
+            value = loader()
+            loaded = True
+        except Exception as e:
+            print(f"Background cache refresh failed for {key}: {str(e)}")
+        finally:
+            with self._lock:
+                self._end_load(key, version, value, loaded)
+                self._refreshing.discard(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses
+            }
@@ -1,67 +1,32 @@
 #!/usr/bin/env python3
 # src/clean_diagram_duplicates.py
-from database import db
+from bank_report import build_report
+from clean_duplicates import parse_args, remove_near_duplicates
 
-def clean_diagram_duplicates():
+def clean_diagram_duplicates(dry_run: bool = True, threshold: float = 0.8):
     """
     Identify and remove duplicate diagram questions from the diagram_questions table.
-    Duplicates are identified by having the same question text within the same subject.
+    Duplicates are near-identical question text and options (MinHash/LSH),
+    anywhere in the table.
     """
     print("Cleaning duplicate diagram questions...")
     
-    # Subjects with diagram questions
-    subjects = [
-        'Digital Logic',
-        'Computer Networks',
-        'Machine Learning',
-        'Cloud Computing',
-    ]
+    duplicate_ids = remove_near_duplicates('diagram_questions', dry_run=dry_run, threshold=threshold)
     
-    total_duplicates = 0
-    
-    for subject in subjects:
-        # Get all questions for this subject
-        result = db.client.table('diagram_questions')\
-            .select('question, id')\
-            .eq('subject', subject)\
-            .execute()
-        
-        if hasattr(result, 'data'):
-            questions = result.data
-            seen_questions = set()
-            duplicate_ids = []
-            
-            # Find duplicates
-            for q in questions:
-                if q['question'] in seen_questions:
-                    duplicate_ids.append(q['id'])
-                else:
-                    seen_questions.add(q['question'])
-            
-            # Delete duplicates
-            if duplicate_ids:
-                db.client.table('diagram_questions')\
-                    .delete()\
-                    .in_('id', duplicate_ids)\
-                    .execute()
-                
-                print(f"Removed {len(duplicate_ids)} duplicate(s) from {subject}")
-                total_duplicates += len(duplicate_ids)
-    
-    print(f"\nTotal duplicates removed: {total_duplicates}")
+    print(f"\nTotal duplicates {'found' if dry_run else 'removed'}: {len(duplicate_ids)}")
     
     # After cleaning duplicates, verify SVG content integrity
-    result = db.client.table('diagram_questions')\
-        .select('id, subject')\
-        .is_('svg_code', 'null')\
-        .execute()
-    
-    if hasattr(result, 'data') and result.data:
-        print(f"\nWarning: Found {len(result.data)} questions with missing SVG content after cleanup.")
-        for item in result.data:
-            print(f"  - ID: {item['id']}, Subject: {item['subject']}")
+    if dry_run:
+        return
+    report = build_report('diagram_questions')
+    missing = report['problems'].get('null_svg_code', 0)
+    if missing:
+        print(f"\nWarning: Found {missing} questions with missing SVG content after cleanup.")
+        for item_id in report['problem_examples']['null_svg_code']:
+            print(f"  - ID: {item_id}")
     else:
         print("\nAll remaining diagram questions have valid SVG content.")
 
 if __name__ == "__main__":
-    clean_diagram_duplicates() 
\ No newline at end of file
+    args = parse_args("Remove near-duplicate questions from diagram_questions.")
+    clean_diagram_duplicates(dry_run=not args.apply, threshold=args.threshold) 
\ No newline at end of file
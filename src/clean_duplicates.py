@@ -1,49 +1,62 @@
 # src/clean_duplicates.py
+import argparse
+from typing import List
 from database import db
+from dedup import DedupIndex, question_text
+from question_bank import iter_rows
 
-def clean_duplicates():
-    print("Cleaning duplicate questions...")
+# Ids per delete request
+DELETE_CHUNK_SIZE = 200
+
+def remove_near_duplicates(table: str, dry_run: bool = True, threshold: float = 0.8) -> List[str]:
+    """
+    Find near-duplicate questions across the whole table with MinHash/LSH and
+    delete all but the oldest of each group. The signatures of the remaining
+    questions are stored so new questions can be checked at insert time.
+    Every pair is printed first; nothing is deleted unless dry_run is False.
+    """
+    rows = list(iter_rows(table, 'id, subject, question, options'))
+    index = DedupIndex(table, threshold=threshold)
+    duplicates = index.find_duplicates((str(row['id']), question_text(row)) for row in rows)
     
-    # First, let's identify duplicates
-    subjects = [
-        'Engineering Mathematics',
-        'Digital Logic',
-        'Computer Networks',
-        'Machine Learning',
-        'Software Engineering',
-        'Cloud Computing',
-        'Cybersecurity',
-        'Aptitude and Reasoning',
-        'Deep Learning'
-    ]
+    by_id = {str(row['id']): row for row in rows}
+    removed_by_subject = {}
+    for duplicate_id, original_id, similarity in duplicates:
+        subject = by_id[duplicate_id]['subject']
+        removed_by_subject[subject] = removed_by_subject.get(subject, 0) + 1
+        print(f"  {duplicate_id} duplicates {original_id} ({similarity:.0%} similar): "
+              f"{by_id[duplicate_id]['question'][:80]}")
     
-    for subject in subjects:
-        # Get all questions for this subject
-        result = db.client.table('mock_questions')\
-            .select('question, id')\
-            .eq('subject', subject)\
+    duplicate_ids = [duplicate_id for duplicate_id, _, _ in duplicates]
+    if dry_run:
+        print(f"Dry run: {len(duplicate_ids)} duplicate(s) found in {table}, nothing deleted "
+              f"(rerun with --apply to delete them)")
+        return duplicate_ids
+    
+    for start in range(0, len(duplicate_ids), DELETE_CHUNK_SIZE):
+        db.client.table(table)\
+            .delete()\
+            .in_('id', [by_id[i]['id'] for i in duplicate_ids[start:start + DELETE_CHUNK_SIZE]])\
             .execute()
-        
-        if hasattr(result, 'data'):
-            questions = result.data
-            seen_questions = set()
-            duplicate_ids = []
-            
-            # Find duplicates
-            for q in questions:
-                if q['question'] in seen_questions:
-                    duplicate_ids.append(q['id'])
-                else:
-                    seen_questions.add(q['question'])
-            
-            # Delete duplicates
-            if duplicate_ids:
-                db.client.table('mock_questions')\
-                    .delete()\
-                    .in_('id', duplicate_ids)\
-                    .execute()
-                
-                print(f"Removed {len(duplicate_ids)} duplicate(s) from {subject}")
+    
+    for subject, count in removed_by_subject.items():
+        print(f"Removed {count} duplicate(s) from {subject}")
+    
+    removed = set(duplicate_ids)
+    index.rebuild((i, question_text(row)) for i, row in by_id.items() if i not in removed)
+    return duplicate_ids
+
+def clean_duplicates(dry_run: bool = True, threshold: float = 0.8):
+    print("Cleaning duplicate questions...")
+    remove_near_duplicates('mock_questions', dry_run=dry_run, threshold=threshold)
+
+def parse_args(description: str):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--apply', action='store_true',
+                        help="Delete the reported duplicates (by default they are only listed)")
+    parser.add_argument('--threshold', type=float, default=0.8, help="Similarity treated as duplicate")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    clean_duplicates()
\ No newline at end of file
+    args = parse_args("Remove near-duplicate questions from mock_questions.")
+    clean_duplicates(dry_run=not args.apply, threshold=args.threshold)
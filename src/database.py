@@ -3,10 +3,19 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 from typing import Dict, List, Optional
+from cache import TTLCache
 
 # Load environment variables
 load_dotenv()
 
+# Score needed to move a subject up one difficulty level
+ADVANCEMENT_THRESHOLD = 0.7
+NEXT_DIFFICULTY = {
+    'beginner': 'intermediate',
+    'intermediate': 'advanced',
+    'advanced': 'advanced'
+}
+
 class Database:
     def __init__(self):
         """Initialize Supabase client."""
@@ -26,6 +35,20 @@ class Database:
             print("Successfully connected to Supabase")
         except Exception as e:
             print(f"Warning: Could not verify Supabase connection: {str(e)}")
+        
+        # Read-through cache for subject_progress, keyed by user id
+        self.progress_cache = TTLCache(
+            ttl=float(os.getenv('PROGRESS_CACHE_TTL', '30')),
+            max_size=int(os.getenv('PROGRESS_CACHE_SIZE', '1024')),
+            stale_ttl=float(os.getenv('PROGRESS_CACHE_STALE_TTL', '300'))
+        )
+        
+        # Cleared if the record_attempt function (sql/record_attempt.sql) is missing
+        self.record_attempt_rpc = True
+        # Cleared if the (user_id, subject) constraint (sql/subject_progress_unique.sql) is missing
+        self.progress_upsert = True
+        # Cleared if the recent_test_history function (sql/recent_test_history.sql) is missing
+        self.recent_history_rpc = True
     
     def create_user(self, user_id: str, email: str) -> Dict:
         """Create a new user record."""
@@ -45,7 +68,14 @@ class Database:
         }).eq('id', user_id).execute()
     
     def get_user_progress(self, user_id: str) -> List[Dict]:
-        """Get user's progress for all subjects."""
+        """Get user's progress for all subjects (served from the progress cache)."""
+        return self.progress_cache.get_or_load(
+            user_id,
+            lambda: self._fetch_user_progress(user_id)
+        )
+    
+    def _fetch_user_progress(self, user_id: str) -> List[Dict]:
+        """Fetch user's progress for all subjects from Supabase."""
         return self.client.table('subject_progress').select('*').eq('user_id', user_id).execute()
     
     def update_subject_progress(
@@ -56,27 +86,77 @@ class Database:
         difficulty_level: str,
         mastered: bool = False
     ) -> Dict:
-        """Update user's progress in a subject."""
-        data = {
-            'user_id': user_id,
+        """Update user's progress in a subject (insert on first attempt)."""
+        return self.update_subject_progress_bulk(user_id, [{
             'subject': subject,
-            'current_score': score,
+            'score': score,
             'difficulty_level': difficulty_level,
-            'mastered': mastered,
-            'last_attempt': datetime.now().isoformat()
-        }
+            'mastered': mastered
+        }])
+    
+    def update_subject_progress_bulk(self, user_id: str, updates: List[Dict]) -> Dict:
+        """Upsert progress for several subjects in one request.
         
-        # Try to update existing record
-        result = self.client.table('subject_progress').update(data).eq(
-            'user_id', user_id
-        ).eq('subject', subject).execute()
+        Each update has `subject`, `score`, `difficulty_level` and optionally
+        `mastered`. The upsert needs the unique (user_id, subject) constraint
+        from sql/subject_progress_unique.sql; without it existing rows are
+        looked up and updated, and the rest inserted.
+        """
+        now = datetime.now().isoformat()
+        rows = [
+            {
+                'user_id': user_id,
+                'subject': update['subject'],
+                'current_score': update['score'],
+                'difficulty_level': update['difficulty_level'],
+                'mastered': update.get('mastered', False),
+                'last_attempt': now
+            }
+            for update in updates
+        ]
         
-        # If no record exists, create new one
-        if not result.data:
-            result = self.client.table('subject_progress').insert(data).execute()
+        result = None
+        if self.progress_upsert:
+            try:
+                result = self.client.table('subject_progress').upsert(
+                    rows, on_conflict='user_id,subject'
+                ).execute()
+            except Exception as e:
+                # 42P10: no unique constraint matching the ON CONFLICT target
+                if '42P10' in str(e) or 'no unique or exclusion constraint' in str(e):
+                    print("subject_progress (user_id, subject) constraint missing; using update or insert")
+                    self.progress_upsert = False
+                else:
+                    raise
         
+        if result is None:
+            result = self._update_or_insert_progress(user_id, rows)
+        
+        self.progress_cache.invalidate(user_id)
         return result
     
+    def _update_or_insert_progress(self, user_id: str, rows: List[Dict]) -> Dict:
+        """Same as the upsert, without relying on the unique constraint."""
+        existing = self.client.table('subject_progress')\
+            .select('subject')\
+            .eq('user_id', user_id)\
+            .in_('subject', [row['subject'] for row in rows])\
+            .execute()
+        existing_subjects = {item['subject'] for item in existing.data or []}
+        
+        for row in rows:
+            if row['subject'] in existing_subjects:
+                self.client.table('subject_progress')\
+                    .update(row)\
+                    .eq('user_id', user_id)\
+                    .eq('subject', row['subject'])\
+                    .execute()
+        
+        new_rows = [row for row in rows if row['subject'] not in existing_subjects]
+        if new_rows:
+            return self.client.table('subject_progress').insert(new_rows).execute()
+        return existing
+    
     def add_test_result(
         self,
         user_id: str,
@@ -99,7 +179,105 @@ class Database:
             'test_date': datetime.now().isoformat()
         }
         
-        return self.client.table('test_history').insert(data).execute()
+        result = self.client.table('test_history').insert(data).execute()
+        self.progress_cache.invalidate(user_id)
+        return result
+    
+    def record_attempt(
+        self,
+        user_id: str,
+        subject: str,
+        score: float,
+        time_taken: float,
+        num_questions: int,
+        correct_answers: int
+    ) -> Dict:
+        """Record a test result and advance subject progress in one round trip.
+        
+        Calls the `record_attempt` Postgres function, falling back to separate
+        requests if it isn't installed. Returns the previous and new
+        difficulty level and whether it changed.
+        """
+        if self.record_attempt_rpc:
+            try:
+                result = self.client.rpc('record_attempt', {
+                    'p_user_id': user_id,
+                    'p_subject': subject,
+                    'p_score': score,
+                    'p_time_taken': time_taken,
+                    'p_num_questions': num_questions,
+                    'p_correct_answers': correct_answers
+                }).execute()
+                self.progress_cache.invalidate(user_id)
+                return result.data
+            except Exception as e:
+                if 'record_attempt' in str(e) and ('PGRST202' in str(e) or 'does not exist' in str(e)):
+                    print("record_attempt function not installed; using separate requests")
+                    self.record_attempt_rpc = False
+                else:
+                    raise
+        
+        return self._record_attempt_fallback(
+            user_id, subject, score, time_taken, num_questions, correct_answers
+        )
+    
+    def _record_attempt_fallback(
+        self,
+        user_id: str,
+        subject: str,
+        score: float,
+        time_taken: float,
+        num_questions: int,
+        correct_answers: int
+    ) -> Dict:
+        """Same as the record_attempt function, as separate requests.
+        
+        Progress goes through update_subject_progress, which works with or
+        without the (user_id, subject) constraint.
+        """
+        progress_result = self.get_user_progress(user_id)
+        current_difficulty = 'beginner'
+        for item in getattr(progress_result, 'data', None) or []:
+            if isinstance(item, dict) and item.get('subject') == subject:
+                current_difficulty = item.get('difficulty_level', 'beginner')
+                break
+        
+        self.add_test_result(
+            user_id=user_id,
+            subject=subject,
+            score=score,
+            difficulty_level=current_difficulty,
+            time_taken=time_taken,
+            num_questions=num_questions,
+            correct_answers=correct_answers
+        )
+        
+        new_difficulty = current_difficulty
+        if score >= ADVANCEMENT_THRESHOLD:
+            new_difficulty = NEXT_DIFFICULTY.get(current_difficulty, 'beginner')
+            if new_difficulty != current_difficulty:
+                # Keep the score that achieved advancement
+                self.update_subject_progress(
+                    user_id=user_id,
+                    subject=subject,
+                    score=score,
+                    difficulty_level=new_difficulty,
+                    mastered=(new_difficulty == 'advanced')
+                )
+        else:
+            self.update_subject_progress(
+                user_id=user_id,
+                subject=subject,
+                score=score,
+                difficulty_level=current_difficulty,
+                mastered=False
+            )
+        
+        return {
+            'previous_difficulty': current_difficulty,
+            'difficulty_level': new_difficulty,
+            'difficulty_changed': new_difficulty != current_difficulty
+        }
     
     def get_test_history(
         self,
@@ -114,6 +292,66 @@ class Database:
             query = query.eq('subject', subject)
         
         return query.order('test_date', desc=True).limit(limit).execute()
+    
+    def get_recent_test_history(
+        self,
+        user_id: str,
+        subjects: Optional[List[str]] = None,
+        limit: int = 10
+    ) -> Dict[str, List[Dict]]:
+        """Get the last `limit` attempts for every subject, newest first.
+        
+        Calls the `recent_test_history` Postgres function, which ranks the
+        attempts per subject with a window function so at most `limit` rows
+        per subject are returned. Without it, falls back to the newest
+        `limit * len(subjects)` attempts in one request, split per subject
+        in Python (a very active subject can crowd out older attempts of
+        the others).
+        """
+        if self.recent_history_rpc:
+            try:
+                result = self.client.rpc('recent_test_history', {
+                    'p_user_id': user_id,
+                    'p_subjects': list(subjects) if subjects else None,
+                    'p_limit': limit
+                }).execute()
+                history: Dict[str, List[Dict]] = {}
+                for item in result.data or []:
+                    history.setdefault(item['subject'], []).append(item)
+                return history
+            except Exception as e:
+                if 'recent_test_history' in str(e) and ('PGRST202' in str(e) or 'does not exist' in str(e)):
+                    print("recent_test_history function not installed; using one bounded request")
+                    self.recent_history_rpc = False
+                else:
+                    raise
+        
+        if subjects is None:
+            # Every subject with an attempt has a progress row
+            progress_result = self.get_user_progress(user_id)
+            subjects = [
+                item['subject'] for item in getattr(progress_result, 'data', None) or []
+                if isinstance(item, dict) and item.get('subject')
+            ]
+        
+        if not subjects:
+            return {}
+        
+        # One ordered request, bounded to what the busiest subject could need
+        result = self.client.table('test_history')\
+            .select('subject, score, test_date, difficulty_level')\
+            .eq('user_id', user_id)\
+            .in_('subject', list(subjects))\
+            .order('test_date', desc=True)\
+            .limit(limit * len(subjects))\
+            .execute()
+        
+        history: Dict[str, List[Dict]] = {}
+        for item in result.data or []:
+            attempts = history.setdefault(item['subject'], [])
+            if len(attempts) < limit:
+                attempts.append(item)
+        return history
 
 # Create a singleton instance
 db = Database() 
\ No newline at end of file
@@ -0,0 +1,242 @@
+# src/dedup.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Mersenne prime 2^31 - 1 keeps (a * x + b) within uint64
+MERSENNE_PRIME = (1 << 31) - 1
+# Character shingles tolerate the small rewordings LLMs produce
+SHINGLE_SIZE = 5
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9]+', ' ', (text or '').lower())).strip()
+
+
+def shingles(text: str) -> set:
+    """Character 5-grams of the normalized text."""
+    normalized = normalize(text)
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+
+def question_text(row: Dict) -> str:
+    """Text fingerprinted for a question row: the question plus its options."""
+    options = row.get('options') or []
+    if isinstance(options, (list, tuple)):
+        options = ' '.join(str(option) for option in options)
+    return f"{row.get('question', '')} {options}"
+
+
+def _stable_hash(value: str) -> int:
+    # Python's hash() is salted per process; signatures must survive restarts
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class DedupIndex:
+    """
+    Near-duplicate detection for question text with MinHash + LSH banding.
+
+    Each text gets a `num_perm` MinHash signature, split into `bands` bands;
+    texts sharing any band bucket become candidates, and a candidate is a
+    duplicate when its estimated Jaccard similarity reaches `threshold`.
+    Signatures are stored per scope (e.g. table) in SQLite so new questions
+    can be checked at insert time without rescanning the table.
+    """
+
+    def __init__(
+        self,
+        scope: str,
+        path: Optional[str] = None,
+        num_perm: int = 128,
+        bands: int = 16,
+        threshold: float = 0.8,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if path is None:
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.path.join(project_root, 'data', 'processed', 'dedup_signatures.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.scope = scope
+        self.path = path
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.threshold = threshold
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS signatures (
+                scope TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                signature BLOB NOT NULL,
+                PRIMARY KEY (scope, item_id)
+            );
+            CREATE TABLE IF NOT EXISTS buckets (
+                scope TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                item_id TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_buckets_lookup ON buckets (scope, bucket);
+            CREATE INDEX IF NOT EXISTS idx_buckets_item ON buckets (scope, item_id);
+        """)
+        self._conn.commit()
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of the text's shingles."""
+        values = np.array(
+            [_stable_hash(s) % MERSENNE_PRIME for s in shingles(text)] or [0],
+            dtype=np.uint64
+        )
+        # (num_perm x num_shingles) permuted hashes, min over shingles
+        hashed = (np.outer(self._a, values) + self._b[:, None]) % MERSENNE_PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[str]:
+        """One bucket key per band."""
+        rows = signature.reshape(self.bands, self.rows_per_band)
+        return [
+            f"{band}:{hashlib.blake2b(row.tobytes(), digest_size=8).hexdigest()}"
+            for band, row in enumerate(rows)
+        ]
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(a == b))
+
+    def find_duplicates(self, items: Iterable[Tuple[str, str]]) -> List[Tuple[str, str, float]]:
+        """
+        Scan (id, text) items in order and return (duplicate_id, original_id,
+        similarity) for every item that nearly matches an earlier kept item.
+        """
+        buckets: Dict[str, List[str]] = {}
+        kept: Dict[str, np.ndarray] = {}
+        duplicates = []
+        for item_id, text in items:
+            signature = self.signature(text)
+            keys = self.band_keys(signature)
+            match = self._best_match(signature, keys, buckets, kept)
+            if match is not None:
+                duplicates.append((item_id, *match))
+                continue
+            kept[item_id] = signature
+            for key in keys:
+                buckets.setdefault(key, []).append(item_id)
+        return duplicates
+
+    def _best_match(self, signature: np.ndarray, keys: List[str],
+                    buckets: Dict[str, List[str]], kept: Dict[str, np.ndarray]) -> Optional[Tuple[str, float]]:
+        """Most similar in-memory candidate at or above the threshold."""
+        best_id, best = None, 0.0
+        for candidate in {c for key in keys for c in buckets.get(key, ())}:
+            score = self.similarity(signature, kept[candidate])
+            if score > best:
+                best_id, best = candidate, score
+        if best_id is None or best < self.threshold:
+            return None
+        return best_id, best
+
+    def query(self, text: str) -> List[Tuple[str, float]]:
+        """Stored items that nearly match the text, best match first."""
+        return self._query_signature(self.signature(text))
+
+    def _query_signature(self, signature: np.ndarray) -> List[Tuple[str, float]]:
+        keys = self.band_keys(signature)
+        placeholders = ','.join('?' * len(keys))
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT s.item_id, s.signature FROM signatures s
+                WHERE s.scope = ? AND s.item_id IN (
+                    SELECT item_id FROM buckets WHERE scope = ? AND bucket IN ({placeholders})
+                )
+            """, (self.scope, self.scope, *keys)).fetchall()
+        matches = []
+        for item_id, blob in rows:
+            score = self.similarity(signature, np.frombuffer(blob, dtype=np.uint32))
+            if score >= self.threshold:
+                matches.append((item_id, score))
+        return sorted(matches, key=lambda m: m[1], reverse=True)
+
+    def filter_new(self, items: Iterable[Tuple[str, str]]) -> Tuple[List[str], List[Tuple[str, str, float]]]:
+        """
+        Split (key, text) items into keys to insert and (key, matched, similarity)
+        duplicates, checking against stored signatures and earlier items.
+        """
+        accepted = []
+        duplicates = []
+        buckets: Dict[str, List[str]] = {}
+        kept: Dict[str, np.ndarray] = {}
+        for key, text in items:
+            signature = self.signature(text)
+            stored = self._query_signature(signature)
+            if stored:
+                duplicates.append((key, *stored[0]))
+                continue
+            keys = self.band_keys(signature)
+            match = self._best_match(signature, keys, buckets, kept)
+            if match is not None:
+                duplicates.append((key, *match))
+                continue
+            accepted.append(key)
+            kept[key] = signature
+            for band_key in keys:
+                buckets.setdefault(band_key, []).append(key)
+        return accepted, duplicates
+
+    def add_many(self, items: Iterable[Tuple[str, str]]):
+        """Store signatures for (id, text) items."""
+        records = []
+        for item_id, text in items:
+            signature = self.signature(text)
+            records.append((str(item_id), signature, self.band_keys(signature)))
+        with self._lock:
+            for item_id, signature, keys in records:
+                self._conn.execute(
+                    'DELETE FROM buckets WHERE scope = ? AND item_id = ?', (self.scope, item_id)
+                )
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO signatures (scope, item_id, signature) VALUES (?, ?, ?)',
+                    (self.scope, item_id, signature.tobytes())
+                )
+                self._conn.executemany(
+                    'INSERT INTO buckets (scope, bucket, item_id) VALUES (?, ?, ?)',
+                    [(self.scope, key, item_id) for key in keys]
+                )
+            self._conn.commit()
+
+    def remove(self, item_ids: Iterable[str]):
+        ids = [(self.scope, str(item_id)) for item_id in item_ids]
+        with self._lock:
+            self._conn.executemany('DELETE FROM buckets WHERE scope = ? AND item_id = ?', ids)
+            self._conn.executemany('DELETE FROM signatures WHERE scope = ? AND item_id = ?', ids)
+            self._conn.commit()
+
+    def rebuild(self, items: Iterable[Tuple[str, str]]):
+        """Replace all stored signatures of this scope."""
+        with self._lock:
+            self._conn.execute('DELETE FROM buckets WHERE scope = ?', (self.scope,))
+            self._conn.execute('DELETE FROM signatures WHERE scope = ?', (self.scope,))
+            self._conn.commit()
+        self.add_many(items)
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM signatures WHERE scope = ?', (self.scope,)
+            ).fetchone()[0]
@@ -0,0 +1,133 @@
+# src/event_loop.py
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import queue
+import threading
+from typing import Any, AsyncIterator, Coroutine, Iterator, Optional
+
+
+class BackgroundLoop:
+    """A single long-lived asyncio event loop running in a daemon thread.
+
+    Sync code (Flask views, worker threads) submits coroutines with `run()`;
+    everything created on the loop - HTTP sessions, semaphores, caches of
+    in-flight tasks - is shared across requests instead of being torn down
+    with a per-request `asyncio.run`.
+    """
+
+    def __init__(self, name: str = 'gate-ai-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Return the running loop, starting it on first use."""
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    ready = threading.Event()
+                    loop = asyncio.new_event_loop()
+
+                    def serve():
+                        asyncio.set_event_loop(loop)
+                        loop.call_soon(ready.set)
+                        loop.run_forever()
+
+                    self._thread = threading.Thread(target=serve, name=self.name, daemon=True)
+                    self._thread.start()
+                    ready.wait()
+                    self._loop = loop
+        return self._loop
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop and return a thread-safe future.
+
+        The caller's contextvars (e.g. Flask's request context) are copied
+        into the task so the coroutine sees the same request and session.
+        """
+        loop = self.loop
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        context = contextvars.copy_context()
+
+        def start():
+            if future.cancelled():
+                coro.close()
+                return
+            task = loop.create_task(coro)
+
+            def cancel(f: concurrent.futures.Future):
+                if f.cancelled():
+                    loop.call_soon_threadsafe(task.cancel)
+
+            def done(t: asyncio.Task):
+                if future.done():
+                    return
+                if t.cancelled():
+                    future.cancel()
+                elif t.exception() is not None:
+                    future.set_exception(t.exception())
+                else:
+                    future.set_result(t.result())
+
+            task.add_done_callback(done)
+            future.add_done_callback(cancel)
+
+        loop.call_soon_threadsafe(start, context=context)
+        return future
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread for its result."""
+        if self.in_loop_thread():
+            raise RuntimeError("BackgroundLoop.run() cannot be called from the loop thread")
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, async_iterable: AsyncIterator) -> Iterator:
+        """Consume an async iterator on the loop and yield its items to sync code.
+
+        Used for streaming responses: the WSGI thread blocks on a queue while
+        the items are produced on the shared loop. Closing the returned
+        generator cancels the producer.
+        """
+        items: queue.Queue = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async for item in async_iterable:
+                    items.put((item, None))
+            except Exception as e:
+                items.put((None, e))
+            finally:
+                items.put((done, None))
+
+        future = self.submit(pump())
+        try:
+            while True:
+                item, error = items.get()
+                if error is not None:
+                    raise error
+                if item is done:
+                    break
+                yield item
+        finally:
+            future.cancel()
+
+    def stop(self):
+        with self._lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+                self._loop = None
+                self._thread = None
+
+
+# Shared loop for the whole process
+background_loop = BackgroundLoop()
+atexit.register(background_loop.stop)
@@ -0,0 +1,144 @@
+# src/llm_cache.py
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class LLMResponseCache:
+    """
+    Disk-backed cache of LLM responses keyed by prompt fingerprint.
+
+    Each key holds up to `max_variants` responses: lookups miss until the
+    key has collected that many variants, then a random one is served so
+    users don't all see the same question set. Entries expire after `ttl`
+    seconds and the least recently used ones are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl: float = 7 * 24 * 3600,
+        max_variants: int = 3,
+        max_entries: int = 5000
+    ):
+        if path is None:
+            project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            path = os.path.join(project_root, 'data', 'processed', 'llm_cache.db')
+        self.path = path
+        self.ttl = ttl
+        self.max_variants = max_variants
+        self.max_entries = max_entries
+        self.counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        # Opened on first use, so importing the shared client creates no file
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        """The cache database, created on first use (call with the lock held)."""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_key ON responses (key)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def key_for(model: str, messages: List[Dict], params: Dict,
+                topic: Optional[str] = None, difficulty: Optional[str] = None) -> str:
+        """Fingerprint (model, normalized prompt, sampling params, topic, difficulty)."""
+        normalized = [
+            {'role': m['role'], 'content': re.sub(r'\s+', ' ', m['content']).strip()}
+            for m in messages
+        ]
+        material = json.dumps({
+            'model': model,
+            'messages': normalized,
+            'params': params,
+            'topic': topic,
+            'difficulty': difficulty
+        }, sort_keys=True)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return a cached variant once the key has a full set of them."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            rows = conn.execute(
+                'SELECT rowid, content FROM responses WHERE key = ? AND created_at > ?',
+                (key, now - self.ttl)
+            ).fetchall()
+            if len(rows) < self.max_variants:
+                self.counters['misses'] += 1
+                return None
+            rowid, content = random.choice(rows)
+            conn.execute('UPDATE responses SET last_used = ? WHERE rowid = ?', (now, rowid))
+            conn.commit()
+            self.counters['hits'] += 1
+            return content
+
+    def put(self, key: str, content: str):
+        """Store a new variant, replacing the oldest one when the key is full."""
+        now = time.time()
+        with self._lock:
+            conn = self._db()
+            conn.execute(
+                'DELETE FROM responses WHERE key = ? AND created_at <= ?',
+                (key, now - self.ttl)
+            )
+            conn.execute(
+                'INSERT INTO responses (key, content, created_at, last_used) VALUES (?, ?, ?, ?)',
+                (key, content, now, now)
+            )
+            conn.execute("""
+                DELETE FROM responses WHERE key = ? AND rowid NOT IN (
+                    SELECT rowid FROM responses WHERE key = ? ORDER BY created_at DESC LIMIT ?
+                )
+            """, (key, key, self.max_variants))
+            self.counters['stores'] += 1
+
+            total = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            if total > self.max_entries:
+                evicted = conn.execute("""
+                    DELETE FROM responses WHERE rowid IN (
+                        SELECT rowid FROM responses ORDER BY last_used ASC LIMIT ?
+                    )
+                """, (total - self.max_entries,)).rowcount
+                self.counters['evictions'] += evicted
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._db()
+            conn.execute('DELETE FROM responses')
+            conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conn = self._db()
+            entries = conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+            keys = conn.execute('SELECT COUNT(DISTINCT key) FROM responses').fetchone()[0]
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            **self.counters,
+            'entries': entries,
+            'keys': keys,
+            'hit_rate': round(self.counters['hits'] / lookups, 3) if lookups else None
+        }
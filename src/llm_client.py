@@ -0,0 +1,265 @@
+# src/llm_client.py
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+import aiohttp
+from dotenv import load_dotenv
+from llm_cache import LLMResponseCache
+from prompts import count_message_tokens, count_tokens
+
+load_dotenv()
+
+TOGETHER_API_URL = 'https://api.together.xyz/v1/chat/completions'
+DEFAULT_MODEL = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+
+
+class CachedResponse(str):
+    """Response content served from the response cache instead of the provider."""
+    from_cache = True
+
+
+class LLMClient:
+    """
+    Shared async client for the Together chat completions API.
+
+    One aiohttp session (keep-alive connection pool) and one concurrency
+    semaphore are kept per event loop, so calls made on the persistent
+    app loop reuse warm TLS connections instead of reconnecting every time.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        api_url: str = TOGETHER_API_URL,
+        model: str = DEFAULT_MODEL,
+        timeout: float = None,
+        connect_timeout: float = None,
+        max_connections: int = None,
+        max_concurrency: int = None,
+        keepalive_timeout: float = 60.0,
+        cache: Optional[LLMResponseCache] = None
+    ):
+        self.api_key = api_key or os.getenv('TOGETHER_API_KEY')
+        self.api_url = api_url
+        self.model = model
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT', '90'))
+        self.connect_timeout = connect_timeout or float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+        self.max_connections = max_connections or int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+        self.max_concurrency = max_concurrency or int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+        self.keepalive_timeout = keepalive_timeout
+        self.cache = cache
+        self._per_loop: Dict[asyncio.AbstractEventLoop, tuple] = {}
+        self.counters = {
+            'requests': 0, 'errors': 0, 'in_flight': 0, 'total_seconds': 0.0,
+            'prompt_tokens': 0, 'completion_tokens': 0, 'streams': 0, 'first_token_seconds': 0.0
+        }
+
+    def _resources(self):
+        """Get (or create) the session and semaphore bound to the running loop."""
+        loop = asyncio.get_running_loop()
+        resources = self._per_loop.get(loop)
+        if resources is None or resources[0].closed:
+            # Forget loops that have been closed (e.g. by asyncio.run in scripts)
+            for other in [l for l in self._per_loop if l.is_closed()]:
+                del self._per_loop[other]
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout),
+                headers={
+                    'Authorization': f'Bearer {self.api_key}',
+                    'Content-Type': 'application/json'
+                }
+            )
+            resources = (session, asyncio.Semaphore(self.max_concurrency))
+            self._per_loop[loop] = resources
+        return resources
+
+    async def chat(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        cache_scope: Optional[Dict] = None,
+        validate: Optional[Callable[[str], bool]] = None,
+        **params
+    ) -> str:
+        """
+        Send a chat completion request and return the message content.
+
+        With a `cache_scope` (topic/difficulty), responses are served from and
+        stored in the response cache; `validate` decides whether a fresh
+        response is good enough to cache. Cached responses are returned as
+        CachedResponse, whose `from_cache` flag is set.
+        """
+        model = model or self.model
+        cache_key = None
+        if self.cache is not None and cache_scope is not None:
+            cache_key = self.cache.key_for(model, messages, params, **cache_scope)
+            # SQLite reads and writes stay off the shared event loop
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                return CachedResponse(cached)
+
+        content = await self._request(messages, model, **params)
+
+        if cache_key is not None and (validate is None or validate(content)):
+            await asyncio.to_thread(self.cache.put, cache_key, content)
+        return content
+
+    def _record_tokens(self, messages: List[Dict], content: str, usage: Optional[Dict]):
+        """Count the call's tokens, from the provider's usage report when it sends one."""
+        usage = usage or {}
+        self.counters['prompt_tokens'] += usage.get('prompt_tokens') or count_message_tokens(messages)
+        self.counters['completion_tokens'] += usage.get('completion_tokens') or count_tokens(content)
+
+    async def _request(self, messages: List[Dict], model: str, **params) -> str:
+        session, semaphore = self._resources()
+        payload = {'model': model, 'messages': messages, **params}
+
+        async with semaphore:
+            self.counters['in_flight'] += 1
+            started = time.perf_counter()
+            try:
+                async with session.post(self.api_url, json=payload) as response:
+                    if response.status != 200:
+                        body = await response.text()
+                        raise Exception(f"API call failed with status {response.status}: {body[:200]}")
+                    data = await response.json()
+                content = data['choices'][0]['message']['content']
+                self._record_tokens(messages, content, data.get('usage'))
+                return content
+            except asyncio.TimeoutError:
+                self.counters['errors'] += 1
+                raise Exception(f"API call failed: timed out after {self.timeout}s")
+            except aiohttp.ClientError as e:
+                self.counters['errors'] += 1
+                raise Exception(f"API call failed: {str(e)}")
+            except Exception:
+                self.counters['errors'] += 1
+                raise
+            finally:
+                self.counters['in_flight'] -= 1
+                self.counters['requests'] += 1
+                self.counters['total_seconds'] += time.perf_counter() - started
+
+    async def stream_chat(
+        self,
+        messages: List[Dict],
+        model: Optional[str] = None,
+        cache_scope: Optional[Dict] = None,
+        validate: Optional[Callable[[str], bool]] = None,
+        **params
+    ) -> AsyncIterator[str]:
+        """
+        Like `chat`, but yield the message content in pieces as the provider
+        streams it (server-sent events). A cached response is yielded whole;
+        a streamed one is cached once complete if `validate` accepts it.
+        """
+        model = model or self.model
+        cache_key = None
+        if self.cache is not None and cache_scope is not None:
+            cache_key = self.cache.key_for(model, messages, params, **cache_scope)
+            # SQLite reads and writes stay off the shared event loop
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                yield CachedResponse(cached)
+                return
+
+        parts = []
+        async for delta in self._stream_request(messages, model, **params):
+            parts.append(delta)
+            yield delta
+
+        content = ''.join(parts)
+        if cache_key is not None and (validate is None or validate(content)):
+            await asyncio.to_thread(self.cache.put, cache_key, content)
+
+    async def _stream_request(self, messages: List[Dict], model: str, **params) -> AsyncIterator[str]:
+        session, semaphore = self._resources()
+        payload = {'model': model, 'messages': messages, 'stream': True, **params}
+
+        async with semaphore:
+            self.counters['in_flight'] += 1
+            started = time.perf_counter()
+            try:
+                async with session.post(self.api_url, json=payload) as response:
+                    if response.status != 200:
+                        body = await response.text()
+                        raise Exception(f"API call failed with status {response.status}: {body[:200]}")
+                    # One "data: {...}" event per line, terminated by "data: [DONE]"
+                    parts = []
+                    usage = None
+                    async for raw_line in response.content:
+                        line = raw_line.decode('utf-8').strip()
+                        if not line.startswith('data:'):
+                            continue
+                        data = line[len('data:'):].strip()
+                        if data == '[DONE]':
+                            break
+                        event = json.loads(data)
+                        if event.get('error'):
+                            raise Exception(f"API call failed: {event['error']}")
+                        # The provider reports usage with the final event
+                        usage = event.get('usage') or usage
+                        choices = event.get('choices') or [{}]
+                        delta = (choices[0].get('delta') or {}).get('content')
+                        if delta:
+                            if not parts:
+                                self.counters['streams'] += 1
+                                self.counters['first_token_seconds'] += time.perf_counter() - started
+                            parts.append(delta)
+                            yield delta
+                    self._record_tokens(messages, ''.join(parts), usage)
+            except asyncio.TimeoutError:
+                self.counters['errors'] += 1
+                raise Exception(f"API call failed: timed out after {self.timeout}s")
+            except aiohttp.ClientError as e:
+                self.counters['errors'] += 1
+                raise Exception(f"API call failed: {str(e)}")
+            except Exception:
+                self.counters['errors'] += 1
+                raise
+            finally:
+                self.counters['in_flight'] -= 1
+                self.counters['requests'] += 1
+                self.counters['total_seconds'] += time.perf_counter() - started
+
+    async def close(self):
+        """Close the session bound to the running loop."""
+        resources = self._per_loop.pop(asyncio.get_running_loop(), None)
+        if resources is not None:
+            await resources[0].close()
+
+    def stats(self) -> Dict:
+        requests = self.counters['requests']
+        return {
+            'requests': requests,
+            'errors': self.counters['errors'],
+            'in_flight': self.counters['in_flight'],
+            'avg_seconds': round(self.counters['total_seconds'] / requests, 3) if requests else None,
+            'prompt_tokens': self.counters['prompt_tokens'],
+            'completion_tokens': self.counters['completion_tokens'],
+            'avg_prompt_tokens': round(self.counters['prompt_tokens'] / requests) if requests else None,
+            'avg_first_token_seconds': (
+                round(self.counters['first_token_seconds'] / self.counters['streams'], 3)
+                if self.counters['streams'] else None
+            ),
+            'max_concurrency': self.max_concurrency,
+            'max_connections': self.max_connections,
+            'cache': self.cache.stats() if self.cache is not None else None
+        }
+
+
+# Shared client used by question_generation and mock_generator
+llm_client = LLMClient(
+    cache=LLMResponseCache(
+        ttl=float(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600))),
+        max_variants=int(os.getenv('LLM_CACHE_VARIANTS', '3')),
+        max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+    ) if os.getenv('LLM_CACHE', '1') == '1' else None
+)
@@ -0,0 +1,257 @@
+# src/llm_parsing.py
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+def _is_index(value, options) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value < len(options)
+
+
+def _as_index(value):
+    """Accept "2" for 2; models sometimes quote option indices."""
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return value
+
+
+def _check_text(q: Dict, fields: Iterable[str]) -> Optional[str]:
+    for field in fields:
+        if not isinstance(q.get(field), str) or not q[field].strip():
+            return f"missing or empty '{field}'"
+    return None
+
+
+def _check_options(q: Dict) -> Optional[str]:
+    options = q.get('options')
+    if not isinstance(options, list) or len(options) < 2:
+        return "'options' must be a list of at least 2 choices"
+    if not all(isinstance(option, (str, int, float)) for option in options):
+        return "'options' must contain plain values"
+    return None
+
+
+def _validate_single(q: Dict) -> Optional[str]:
+    error = _check_text(q, ('question', 'explanation')) or _check_options(q)
+    if error:
+        return error
+    q['correct_answer'] = _as_index(q.get('correct_answer'))
+    if not _is_index(q['correct_answer'], q['options']):
+        return "'correct_answer' must index into 'options'"
+    return None
+
+
+def _validate_multiple_answer(q: Dict) -> Optional[str]:
+    error = _check_text(q, ('question', 'explanation')) or _check_options(q)
+    if error:
+        return error
+    answers = q.get('correct_answers')
+    if not isinstance(answers, list) or not answers:
+        return "'correct_answers' must be a non-empty list"
+    q['correct_answers'] = [_as_index(answer) for answer in answers]
+    if not all(_is_index(answer, q['options']) for answer in q['correct_answers']):
+        return "'correct_answers' must index into 'options'"
+    return None
+
+
+def _validate_numerical(q: Dict) -> Optional[str]:
+    error = _check_text(q, ('question', 'explanation'))
+    if error:
+        return error
+    answer = q.get('correct_answer')
+    if isinstance(answer, str):
+        try:
+            answer = float(answer.strip())
+        except ValueError:
+            return "'correct_answer' must be a number"
+        q['correct_answer'] = answer
+    if not isinstance(answer, (int, float)) or isinstance(answer, bool):
+        return "'correct_answer' must be a number"
+    return None
+
+
+def _validate_diagram(q: Dict) -> Optional[str]:
+    return _check_text(q, ('diagram_description',)) or _validate_single(q)
+
+
+# Question schemas by type; a question's own "type" field selects among them
+SCHEMAS = {
+    'single': _validate_single,
+    'multiple_answer': _validate_multiple_answer,
+    'numerical': _validate_numerical,
+    'diagram': _validate_diagram,
+}
+
+
+def validate_question(q: Dict, question_type: str) -> Optional[str]:
+    """Check (and lightly normalize) a question; returns an error or None."""
+    return SCHEMAS[question_type](q)
+
+
+class QuestionStreamParser:
+    """
+    Incremental parser for question objects in LLM output.
+
+    Text is fed in chunks (a whole response or streamed deltas) and scanned
+    once. Markdown fences and // or /* */ comments are dropped only outside
+    JSON strings, and trailing commas are tolerated. Every complete object
+    with a "question" key is validated against the schema for its type and
+    returned as soon as its closing brace arrives, so a response truncated
+    by max_tokens still yields all the questions before the cut.
+    """
+
+    def __init__(self, types: Tuple[str, ...] = ('single',)):
+        for question_type in types:
+            if question_type not in SCHEMAS:
+                raise ValueError(f"Unknown question type: {question_type}")
+        self.types = types
+        self.objects_seen = 0
+        self.rejected: List[str] = []
+        self._buffer: List[str] = []
+        self._starts: List[int] = []
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._skip_line = False
+        self._in_block_comment = False
+        self._pending = ''
+
+    @property
+    def complete(self) -> bool:
+        """Whether the top-level JSON value has been closed."""
+        return self._started and self._depth == 0 and not self._in_string
+
+    def feed(self, text: str) -> List[Dict]:
+        """Scan more text; returns the valid questions completed by it."""
+        questions = []
+        text = self._pending + text
+        self._pending = ''
+        buffer = self._buffer
+        i = 0
+        n = len(text)
+        while i < n:
+            ch = text[i]
+
+            if self._in_string:
+                buffer.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                i += 1
+                continue
+
+            if self._skip_line:
+                if ch == '\n':
+                    self._skip_line = False
+                i += 1
+                continue
+
+            if self._in_block_comment:
+                if ch == '*' and i + 1 >= n:
+                    self._pending = ch
+                    break
+                if ch == '*' and text[i + 1] == '/':
+                    self._in_block_comment = False
+                    i += 2
+                else:
+                    i += 1
+                continue
+
+            if ch == '/':
+                if i + 1 >= n:
+                    # Need the next character to tell a comment from stray text
+                    self._pending = ch
+                    break
+                if text[i + 1] == '/':
+                    self._skip_line = True
+                    i += 2
+                    continue
+                if text[i + 1] == '*':
+                    self._in_block_comment = True
+                    i += 2
+                    continue
+
+            if ch == '`':
+                # Markdown fence such as ```json
+                self._skip_line = True
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                buffer.append(ch)
+            elif ch in '{[':
+                self._started = True
+                self._depth += 1
+                if ch == '{':
+                    self._starts.append(len(buffer))
+                buffer.append(ch)
+            elif ch in '}]':
+                # Drop a trailing comma before the closing bracket
+                while buffer and buffer[-1] in ' \t\r\n':
+                    buffer.pop()
+                if buffer and buffer[-1] == ',':
+                    buffer.pop()
+                buffer.append(ch)
+                if self._depth > 0:
+                    self._depth -= 1
+                if ch == '}' and self._starts:
+                    question = self._finish_object(self._starts.pop())
+                    if question is not None:
+                        questions.append(question)
+                if self._depth == 0:
+                    buffer.clear()
+                    self._starts.clear()
+            elif self._depth > 0:
+                buffer.append(ch)
+            i += 1
+        return questions
+
+    def _finish_object(self, start: int) -> Optional[Dict]:
+        try:
+            # strict=False accepts raw newlines inside strings
+            obj = json.loads(''.join(self._buffer[start:]), strict=False)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(obj, dict) or 'question' not in obj:
+            return None
+
+        self.objects_seen += 1
+        question_type = self._type_of(obj)
+        if question_type is None:
+            self.rejected.append(f"unexpected question type {obj.get('type')!r}")
+            return None
+        error = validate_question(obj, question_type)
+        if error:
+            self.rejected.append(error)
+            return None
+        return obj
+
+    def _type_of(self, obj: Dict) -> Optional[str]:
+        declared = obj.get('type')
+        if declared in self.types:
+            return declared
+        if len(self.types) == 1:
+            return self.types[0]
+        return None
+
+
+def parse_questions(content: str, types: Tuple[str, ...] = ('single',)) -> Tuple[List[Dict], QuestionStreamParser]:
+    """Parse a complete response; returns the valid questions and the parser (for stats)."""
+    parser = QuestionStreamParser(types)
+    questions = parser.feed(content)
+    questions.extend(parser.feed('\n'))  # flush a held-back trailing character
+    return questions, parser
+
+
+def is_complete_payload(content: str, types: Tuple[str, ...] = ('single',)) -> bool:
+    """Whether a response parses completely into valid questions (worth caching)."""
+    return is_complete_parse(*parse_questions(content, types))
+
+
+def is_complete_parse(questions: List[Dict], parser: QuestionStreamParser) -> bool:
+    """is_complete_payload for a response that has already been parsed."""
+    return parser.complete and bool(questions) and not parser.rejected
@@ -0,0 +1,274 @@
+# src/llm_policy.py
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the provider is degraded.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls are refused for `reset_timeout` seconds; then a single trial call
+    is let through (half-open), which closes the circuit on success and
+    reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = None, reset_timeout: float = None):
+        self.failure_threshold = failure_threshold or int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+        self.reset_timeout = reset_timeout or float(os.getenv('LLM_BREAKER_RESET', '30'))
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_started: Optional[float] = None
+        self.opens = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now."""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            now = time.monotonic()
+            if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                self.trial_started = None
+            if self.state == 'half_open':
+                # One trial at a time; a trial that never reported back is replaced
+                if self.trial_started is None or now - self.trial_started >= self.reset_timeout:
+                    self.trial_started = now
+                    return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or self.failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.opens += 1
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                self.trial_started = None
+
+    def stats(self) -> Dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.failures,
+            'opens': self.opens
+        }
+
+
+# All LLM calls go to the same provider, so they share one breaker
+provider_breaker = CircuitBreaker()
+
+# Policies by name, for /api/stats
+POLICIES: Dict[str, 'CallPolicy'] = {}
+
+
+class CallPolicy:
+    """
+    Deadline, retry, hedging and circuit breaking for one kind of LLM call.
+
+    `call` runs the request under an overall `deadline`. A response that
+    `accept` rejects (e.g. it does not parse into valid questions) is
+    retried, up to `max_attempts` in total; transport errors are retried
+    the same way while the circuit stays closed. With `hedge`, a duplicate
+    request is started when the first one has not answered within the
+    observed p95 latency, and whichever finishes first wins. Only calls
+    answered by the provider count towards the latency window; responses
+    served from the cache (flagged `from_cache`) would drag the p95 down.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        deadline: float = None,
+        max_attempts: int = None,
+        hedge: bool = None,
+        hedge_min_delay: float = None,
+        breaker: Optional[CircuitBreaker] = None,
+        window: int = 200
+    ):
+        self.name = name
+        self.deadline = deadline or float(os.getenv('LLM_DEADLINE', '60'))
+        self.max_attempts = max_attempts or int(os.getenv('LLM_MAX_ATTEMPTS', '2'))
+        self.hedge = hedge if hedge is not None else os.getenv('LLM_HEDGE', '0') == '1'
+        self.hedge_min_delay = hedge_min_delay or float(os.getenv('LLM_HEDGE_MIN_DELAY', '2'))
+        self.breaker = breaker or provider_breaker
+        self.latencies = deque(maxlen=window)
+        self.counters = {
+            'calls': 0, 'successes': 0, 'cache_hits': 0, 'failures': 0, 'rejected': 0, 'retries': 0,
+            'hedges': 0, 'hedge_wins': 0, 'deadline_exceeded': 0, 'short_circuited': 0
+        }
+        POLICIES[name] = self
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def _hedge_delay(self) -> Optional[float]:
+        # Wait for enough samples before trusting the p95
+        if not self.hedge or len(self.latencies) < 20:
+            return None
+        return max(self.hedge_min_delay, self.percentile(0.95))
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            self.counters['short_circuited'] += 1
+            raise CircuitOpenError(
+                f"API call failed: provider unavailable, retrying in up to {self.breaker.reset_timeout:g}s"
+            )
+
+    async def call(self, fn: Callable[[], Awaitable], accept: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Run fn() under the policy. If every attempt is rejected, the last
+        response is returned so the caller reports its own parse error.
+        """
+        self._check_breaker()
+        self.counters['calls'] += 1
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self._attempts(fn, accept), self.deadline)
+        except asyncio.TimeoutError:
+            self.counters['deadline_exceeded'] += 1
+            self.counters['failures'] += 1
+            self.breaker.record_failure()
+            raise Exception(f"API call failed: no response within {self.deadline:g}s")
+        except Exception:
+            self.counters['failures'] += 1
+            raise
+        self.counters['successes'] += 1
+        self._record_latency(started, result)
+        return result
+
+    def _record_latency(self, started: float, response: Any):
+        if getattr(response, 'from_cache', False):
+            self.counters['cache_hits'] += 1
+        else:
+            self.latencies.append(time.perf_counter() - started)
+
+    async def _attempts(self, fn: Callable[[], Awaitable], accept: Optional[Callable[[Any], bool]]) -> Any:
+        result = None
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.counters['retries'] += 1
+            try:
+                result = await self._hedged(fn)
+            except Exception:
+                self.breaker.record_failure()
+                if attempt == self.max_attempts - 1 or self.breaker.state == 'open':
+                    raise
+                continue
+            self.breaker.record_success()
+            if accept is None or accept(result):
+                return result
+            self.counters['rejected'] += 1
+        return result
+
+    async def _hedged(self, fn: Callable[[], Awaitable]) -> Any:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await fn()
+
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.counters['hedges'] += 1
+                tasks.append(asyncio.ensure_future(fn()))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not tasks[0]:
+                            self.counters['hedge_wins'] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def stream(self, fn: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """
+        Iterate fn() under the policy's deadline and breaker. A stream is
+        retried only if it fails before producing anything (after that its
+        items have been handed on), and is never hedged.
+        """
+        self._check_breaker()
+        self.counters['calls'] += 1
+        started = time.perf_counter()
+        for attempt in range(self.max_attempts):
+            if attempt:
+                self.counters['retries'] += 1
+            produced = False
+            first = None
+            iterator = fn().__aiter__()
+            try:
+                while True:
+                    remaining = self.deadline - (time.perf_counter() - started)
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError()
+                    try:
+                        item = await asyncio.wait_for(iterator.__anext__(), remaining)
+                    except StopAsyncIteration:
+                        break
+                    if not produced:
+                        first = item
+                    produced = True
+                    yield item
+            except asyncio.TimeoutError:
+                self.counters['deadline_exceeded'] += 1
+                self.counters['failures'] += 1
+                self.breaker.record_failure()
+                raise Exception(f"API call failed: no response within {self.deadline:g}s")
+            except Exception:
+                self.breaker.record_failure()
+                if produced or attempt == self.max_attempts - 1 or self.breaker.state == 'open':
+                    self.counters['failures'] += 1
+                    raise
+                continue
+            finally:
+                if hasattr(iterator, 'aclose'):
+                    await iterator.aclose()
+            self.breaker.record_success()
+            self.counters['successes'] += 1
+            # A cached stream arrives as a single flagged item
+            self._record_latency(started, first)
+            return
+
+    def stats(self) -> Dict:
+        def ms(value):
+            return round(value * 1000) if value is not None else None
+        return {
+            **self.counters,
+            'deadline': self.deadline,
+            'max_attempts': self.max_attempts,
+            'hedge': self.hedge,
+            'p50_ms': ms(self.percentile(0.5)),
+            'p95_ms': ms(self.percentile(0.95)),
+            'p99_ms': ms(self.percentile(0.99)),
+            'breaker': self.breaker.stats()
+        }
+
+
+def policy_stats() -> Dict:
+    return {name: policy.stats() for name, policy in POLICIES.items()}
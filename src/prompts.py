@@ -0,0 +1,547 @@
+# src/prompts.py
+import os
+import random
+import re
+import string
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+
+# Templates by name, for /api/stats
+TEMPLATES: Dict[str, 'PromptTemplate'] = {}
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text without loading a tokenizer.
+
+    BPE vocabularies keep common words whole but split long words, numbers
+    and markup into several pieces, so every word or symbol counts as one
+    token plus one per further six characters.
+    """
+    return sum(1 + len(piece) // 6 for piece in _TOKEN_PIECES.findall(text))
+
+
+def count_message_tokens(messages: List[Dict]) -> int:
+    """Estimated prompt tokens of a chat request (a few per message for the role markup)."""
+    return sum(4 + count_tokens(m['content']) for m in messages)
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once at import time.
+
+    `text` is a str.format template. Fields listed in `lists` take a list
+    of items joined with the given separator; those named in `trim` are
+    sampled down, in that order, when the rendered prompt would exceed the
+    token budget. A field named in `grouped` takes a list of groups of
+    items instead (e.g. key points per subtopic), and sampling keeps one
+    item of every group before it keeps a second of any. Sampling is seeded
+    (e.g. by topic) so the same request renders the same prompt and keeps
+    hitting the LLM response cache.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        text: str,
+        lists: Optional[Dict[str, str]] = None,
+        trim: Sequence[str] = (),
+        grouped: Sequence[str] = (),
+        budget: Optional[int] = None
+    ):
+        self.name = name
+        self.text = text
+        self.fields = tuple(field for _, field, _, _ in string.Formatter().parse(text) if field)
+        self.lists = lists or {}
+        self.trim = tuple(trim)
+        self.grouped = tuple(grouped)
+        self.budget = budget
+        self.static_tokens = count_tokens(text.format(**{field: '' for field in self.fields}))
+        self._lock = threading.Lock()
+        self.counters = {'renders': 0, 'trimmed': 0, 'items_dropped': 0, 'tokens': 0}
+        TEMPLATES[name] = self
+
+    def _format(self, values: Dict, items: Dict[str, List[str]]) -> str:
+        joined = {field: self.lists[field].join(items[field]) for field in self.lists}
+        return self.text.format(**values, **joined)
+
+    def render(self, seed: Optional[str] = None, budget: Optional[int] = None, **values) -> Tuple[str, int]:
+        """Fill in the template; returns (prompt, estimated tokens)."""
+        budget = budget or self.budget
+        items = {}
+        groups = {}
+        for field in self.lists:
+            value = values.pop(field, ())
+            if field in self.grouped:
+                groups[field] = [index for index, group in enumerate(value) for _ in group]
+                value = [item for group in value for item in group]
+            else:
+                groups[field] = [0] * len(value)
+            items[field] = [str(item) for item in value]
+        prompt = self._format(values, items)
+        tokens = count_tokens(prompt)
+
+        dropped = 0
+        if budget is not None and tokens > budget:
+            for field in self.trim:
+                # Tokens of everything else, then fit a sample of this field's items
+                kept_items = items[field]
+                items[field] = []
+                allowance = budget - count_tokens(self._format(values, items))
+                separator = count_tokens(self.lists[field])
+                items[field] = self._sample(
+                    kept_items, groups[field], allowance, separator, f"{self.name}:{field}:{seed}"
+                )
+                dropped += len(kept_items) - len(items[field])
+                prompt = self._format(values, items)
+                tokens = count_tokens(prompt)
+                if tokens <= budget:
+                    break
+
+        with self._lock:
+            self.counters['renders'] += 1
+            self.counters['tokens'] += tokens
+            if dropped:
+                self.counters['trimmed'] += 1
+                self.counters['items_dropped'] += dropped
+        return prompt, tokens
+
+    @staticmethod
+    def _sample(items: List[str], groups: List[int], allowance: int, separator: int, seed: str) -> List[str]:
+        """
+        Random subset of items (in their original order) that fits the
+        allowance; at least one. Groups are visited round-robin.
+        """
+        rng = random.Random(seed)
+        by_group: Dict[int, List[int]] = {}
+        for index, group in enumerate(groups):
+            by_group.setdefault(group, []).append(index)
+        queues = list(by_group.values())
+        for queue in queues:
+            rng.shuffle(queue)
+        rng.shuffle(queues)
+        order = [queue[turn] for turn in range(max(map(len, queues), default=0))
+                 for queue in queues if turn < len(queue)]
+        kept = []
+        used = 0
+        for index in order:
+            cost = count_tokens(items[index]) + separator
+            if used + cost <= allowance or not kept:
+                kept.append(index)
+                used += cost
+        return [items[index] for index in sorted(kept)]
+
+    def stats(self) -> Dict:
+        renders = self.counters['renders']
+        return {
+            **self.counters,
+            'budget': self.budget,
+            'static_tokens': self.static_tokens,
+            'avg_tokens': round(self.counters['tokens'] / renders) if renders else None
+        }
+
+
+def template_stats() -> Dict:
+    return {name: template.stats() for name, template in TEMPLATES.items()}
+
+
+def split_examples(text: str) -> List[str]:
+    """Split an examples block into its "Example N - ..." parts."""
+    parts = re.split(r'\n(?=Example \d+ - )', text.strip('\n'))
+    return [part.strip('\n') for part in parts if part.strip()]
+
+
+# Topic questions -------------------------------------------------------------
+
+TOPIC_SYSTEM_PROMPT = "You are a technical question generator specialized in creating GATE exam questions. You must respond with a complete, valid JSON object containing questions. Your response must be a properly formatted JSON with no additional text."
+
+# Difficulty-specific instructions
+DIFFICULTY_GUIDELINES = {
+    'beginner': """
+                    - Focus on basic definitions and core concepts
+                    - Use straightforward questions testing fundamental understanding
+                    - Avoid complex scenarios or multi-step problems
+                    - Include simple application of concepts
+                    - Use clear and direct language
+                """,
+    'intermediate': """
+                    - Combine multiple concepts in questions
+                    - Include practical applications and case studies
+                    - Test analytical thinking and problem-solving
+                    - Use moderately complex scenarios
+                    - Require deeper understanding of relationships between concepts
+                """,
+    'advanced': """
+                    - Present complex scenarios requiring deep analysis
+                    - Include edge cases and special conditions
+                    - Require integration of multiple concepts
+                    - Test advanced problem-solving abilities
+                    - Include GATE exam level complexity
+                    - Focus on optimization and best practices
+                """
+}
+
+SUBTOPIC_PROMPT = PromptTemplate('subtopic_questions', """You are a technical question generator for GATE exam preparation.
+Generate {num_questions} multiple choice questions for the subtopic "{subtopic}" in subject "{subject}".
+
+Current difficulty level is {difficulty_level}. Follow these guidelines for this level:
+{guidelines}
+
+Key points to cover:
+{key_points}
+
+Important Instructions:
+1. Questions MUST match the {difficulty_level} difficulty level guidelines above
+2. Each question should be more challenging than beginner level questions
+3. Include practical applications and real-world scenarios
+4. Ensure explanations are detailed and educational
+
+Return ONLY a JSON object with this exact structure:
+{{
+    "questions": [
+        {{
+            "question": "question text here",
+            "options": ["option1", "option2", "option3", "option4"],
+            "correct_answer": 0,
+            "explanation": "explanation here"
+        }}
+    ]
+}}""", lists={'key_points': '\n'}, trim=('key_points',),
+    budget=int(os.getenv('PROMPT_BUDGET_TOPIC', '800')))
+
+SUBJECT_PROMPT = PromptTemplate('subject_questions', """You are a technical question generator for GATE exam preparation.
+Generate {num_questions} multiple choice questions for the subject "{subject}".
+
+Current difficulty level is {difficulty_level}. Follow these guidelines for this level:
+{guidelines}
+
+Key points to cover across subtopics:
+{key_points}
+
+Important Instructions:
+1. Questions MUST match the {difficulty_level} difficulty level guidelines above
+2. Each question should be more challenging than beginner level questions
+3. Include practical applications and real-world scenarios
+4. Ensure explanations are detailed and educational
+5. Generate questions that cover different subtopics
+6. Make sure questions are balanced across subtopics
+7. Include the subtopic name in the explanation when relevant
+
+Return ONLY a JSON object with this exact structure:
+{{
+    "questions": [
+        {{
+            "question": "question text here",
+            "options": ["option1", "option2", "option3", "option4"],
+            "correct_answer": 0,
+            "explanation": "explanation here"
+        }}
+    ]
+}}""", lists={'key_points': '\n'}, trim=('key_points',), grouped=('key_points',),
+    budget=int(os.getenv('PROMPT_BUDGET_TOPIC', '800')))
+
+
+# Diagram questions -----------------------------------------------------------
+
+DIAGRAM_QUESTION_SYSTEM_PROMPT = "You are a technical question generator for GATE exam questions that require diagrams. Generate questions where a diagram would be essential for understanding. Be creative and vary the types of diagrams you create."
+
+SVG_SYSTEM_PROMPT = "You are an SVG diagram generator. Create clear, accurate SVG diagrams for technical questions. Return only valid SVG code with no additional text. Be creative and vary your diagram designs based on the specific concept being illustrated."
+
+
+DIAGRAM_QUESTION_PROMPT = PromptTemplate('diagram_questions', """Generate {count} technical questions for {subject} that would benefit from having a diagram.
+These should be questions where a visual diagram would help understand the problem.
+
+For {subject}, focus on ONE of these topics (choose randomly):
+{diagram_focus}
+
+Format each question as a JSON object with this structure:
+{{
+    "question": "Technical question text that refers to a diagram (keep it concise)",
+    "options": ["option1", "option2", "option3", "option4"],
+    "correct_answer": 2,  // Index of correct option
+    "explanation": "Brief 1-2 line explanation only",
+    "diagram_description": "Detailed description of what diagram should show",
+    "diagram_type": "Specific type of diagram (e.g., 'decision tree', 'network topology', etc.)"
+}}
+
+Important:
+1. The question should explicitly refer to "the diagram" or "the figure shown"
+2. The diagram_description should be detailed enough to create an accurate SVG
+3. Return ONLY a valid JSON array containing the questions
+4. No additional text or formatting
+5. IMPORTANT: Be creative and vary the types of diagrams - don't always use the same diagram type""")
+
+SVG_PROMPT = PromptTemplate('svg_diagram', """Create an SVG diagram based on this description for a {subject} question:
+
+"{diagram_description}"
+
+The diagram should:
+1. Be clear, simple, and focused on the key elements
+2. Use standard SVG elements (rect, circle, line, path, text)
+3. Be 800px wide and 600px tall - USE THE FULL CANVAS SPACE
+4. Scale your coordinates to use the entire available space (0,0 to 800,600)
+5. Use appropriate colors and labels
+6. Be directly embeddable in HTML
+
+Important SVG guidelines:
+- Use the full canvas width (800px) and height (600px) effectively
+- Scale your elements appropriately for the larger canvas
+- Center text labels inside shapes using text-anchor="middle" dominant-baseline="middle"
+- For text inside shapes, use: <text x="[center-x]" y="[center-y]" text-anchor="middle" dominant-baseline="middle">Label</text>
+- Add a 2px stroke to all shapes for better visibility at larger scale
+- Use clear, contrasting colors
+- Include a title element for accessibility
+
+For {subject} diagrams, here are some examples of properly formatted elements:
+```
+{svg_examples}
+```
+
+IMPORTANT: 
+- Be creative and don't just copy the examples
+- Create a diagram that best illustrates the specific concept described
+- Use the FULL 800x600 canvas space - don't cluster elements in a small area
+- Scale your coordinates appropriately (multiply typical coordinates by 2 for the larger canvas)
+Return ONLY the SVG code with no additional text or explanation.""", lists={'svg_examples': '\n\n'}, trim=('svg_examples',),
+    budget=int(os.getenv('PROMPT_BUDGET_SVG', '2000')))
+
+# Diagram topics per subject
+DIAGRAM_FOCUS = {
+    "Digital Logic": """
+- Logic circuit analysis (AND, OR, NOT, XOR gates)
+- Sequential circuit behavior (flip-flops, latches)
+- Karnaugh maps for boolean simplification
+- State diagrams for finite state machines
+- Timing diagrams showing signal transitions
+""",
+    "Computer Networks": """
+- Network topologies (star, bus, ring, mesh)
+- Protocol stack layers (OSI or TCP/IP model)
+- Packet structure and headers
+- Routing algorithms and path selection
+- Subnetting and IP addressing schemes
+""",
+    "Machine Learning": """
+- Decision tree structures
+- Neural network architectures
+- Clustering visualizations
+- Support vector machine boundaries
+- Confusion matrix representations
+""",
+    "Cloud Computing": """
+- Cloud service models (IaaS, PaaS, SaaS)
+- Virtualization architectures
+- Container orchestration diagrams
+- Distributed system architectures
+- Load balancing configurations
+"""
+}
+
+# Subject-specific SVG examples, several per subject
+SVG_EXAMPLES = {
+    "Digital Logic": """
+Example 1 - Logic Gate Circuit:
+<svg width="800" height="600" xmlns="http://www.w3.org/2000/svg">
+  <title>Logic Gate Circuit Example</title>
+  <defs>
+    <marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">
+      <polygon points="0 0, 10 3.5, 0 7" fill="#000000" />
+    </marker>
+  </defs>
+  <!-- Title -->
+  <text x="400" y="60" text-anchor="middle" font-size="28" font-weight="bold">Simple Logic Circuit</text>
+  
+  <!-- Input labels -->
+  <text x="100" y="180" text-anchor="end" font-size="24">A</text>
+  <text x="100" y="300" text-anchor="end" font-size="24">B</text>
+  <text x="100" y="420" text-anchor="end" font-size="24">C</text>
+  
+  <!-- Input lines -->
+  <line x1="120" y1="180" x2="240" y2="180" stroke="#000000" stroke-width="2"/>
+  <line x1="120" y1="300" x2="200" y2="300" stroke="#000000" stroke-width="2"/>
+  <line x1="200" y1="300" x2="200" y2="220" stroke="#000000" stroke-width="2"/>
+  <line x1="200" y1="220" x2="240" y2="220" stroke="#000000" stroke-width="2"/>
+  <line x1="120" y1="420" x2="240" y2="420" stroke="#000000" stroke-width="2"/>
+  
+  <!-- AND Gate -->
+  <path d="M240,160 Q300,160 300,200 Q300,240 240,240 Z" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  <text x="270" y="200" text-anchor="middle" dominant-baseline="middle" font-size="24">AND</text>
+  
+  <!-- OR Gate -->
+  <path d="M240,380 Q270,380 300,400 Q270,420 240,420 Q270,400 240,380 Z" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  <text x="270" y="400" text-anchor="middle" dominant-baseline="middle" font-size="24">OR</text>
+  
+  <!-- Connecting lines -->
+  <line x1="300" y1="200" x2="380" y2="200" stroke="#000000" stroke-width="2"/>
+  <line x1="300" y1="400" x2="380" y2="400" stroke="#000000" stroke-width="2"/>
+  <line x1="380" y1="200" x2="380" y2="280" stroke="#000000" stroke-width="2"/>
+  <line x1="380" y1="400" x2="380" y2="320" stroke="#000000" stroke-width="2"/>
+  
+  <!-- NOT Gate (inverter) -->
+  <path d="M380,280 L440,300 L380,320 Z" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  <circle cx="450" cy="300" r="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  
+  <!-- Output line -->
+  <line x1="460" y1="300" x2="560" y2="300" stroke="#000000" stroke-width="2" marker-end="url(#arrowhead)"/>
+  
+  <!-- Output label -->
+  <text x="580" y="300" font-size="24">Output</text>
+</svg>
+
+Example 2 - State Diagram:
+<svg width="800" height="600" xmlns="http://www.w3.org/2000/svg">
+  <title>State Diagram Example</title>
+  <defs>
+    <marker id="arrowhead" markerWidth="10" markerHeight="7" refX="9" refY="3.5" orient="auto">
+      <polygon points="0 0, 10 3.5, 0 7" fill="#000000" />
+    </marker>
+  </defs>
+  <!-- Title -->
+  <text x="400" y="60" text-anchor="middle" font-size="28" font-weight="bold">Finite State Machine</text>
+  
+  <!-- States -->
+  <circle cx="200" cy="200" r="60" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  <text x="200" y="200" text-anchor="middle" dominant-baseline="middle" font-size="24">S0</text>
+  <text x="200" y="230" text-anchor="middle" dominant-baseline="middle" font-size="18">Idle</text>
+  
+  <circle cx="400" cy="400" r="60" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  <text x="400" y="400" text-anchor="middle" dominant-baseline="middle" font-size="24">S1</text>
+  <text x="400" y="430" text-anchor="middle" dominant-baseline="middle" font-size="18">Processing</text>
+  
+  <circle cx="600" cy="200" r="60" fill="#FFFFFF" stroke="#000000" stroke-width="2"/>
+  <text x="600" y="200" text-anchor="middle" dominant-baseline="middle" font-size="24">S2</text>
+  <text x="600" y="230" text-anchor="middle" dominant-baseline="middle" font-size="18">Done</text>
+  
+  <!-- Transitions -->
+  <path d="M250 230 C 300 300, 350 350, 350 400" stroke="#000000" stroke-width="2" fill="none" marker-end="url(#arrowhead)"/>
+  <text x="280" y="320" text-anchor="middle" font-size="18">Start=1</text>
+  
+  <path d="M450 370 C 500 300, 550 250, 550 200" stroke="#000000" stroke-width="2" fill="none" marker-end="url(#arrowhead)"/>
+  <text x="520" y="320" text-anchor="middle" font-size="18">Done=1</text>
+  
+  <path d="M600 140 C 600 100, 200 100, 200 140" stroke="#000000" stroke-width="2" fill="none" marker-end="url(#arrowhead)"/>
+  <text x="400" y="120" text-anchor="middle" font-size="18">Reset=1</text>
+</svg>
+
+Example 3 - Timing Diagram:
+<svg width="800" height="600" xmlns="http://www.w3.org/2000/svg">
+  <title>Timing Diagram Example</title>
+  <!-- Title -->
+  <text x="400" y="60" text-anchor="middle" font-size="28" font-weight="bold">Digital Timing Diagram</text>
+  
+  <!-- Time axis -->
+  <line x1="100" y1="500" x2="700" y2="500" stroke="#000000" stroke-width="2"/>
+  <text x="400" y="530" text-anchor="middle" font-size="20">Time</text>
+  
+  <!-- Time markers -->
+  <line x1="100" y1="500" x2="100" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="100" y="530" text-anchor="middle" font-size="16">0</text>
+  <line x1="200" y1="500" x2="200" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="200" y="530" text-anchor="middle" font-size="16">1</text>
+  <line x1="300" y1="500" x2="300" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="300" y="530" text-anchor="middle" font-size="16">2</text>
+  <line x1="400" y1="500" x2="400" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="400" y="530" text-anchor="middle" font-size="16">3</text>
+  <line x1="500" y1="500" x2="500" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="500" y="530" text-anchor="middle" font-size="16">4</text>
+  <line x1="600" y1="500" x2="600" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="600" y="530" text-anchor="middle" font-size="16">5</text>
+  <line x1="700" y1="500" x2="700" y2="510" stroke="#000000" stroke-width="2"/>
+  <text x="700" y="530" text-anchor="middle" font-size="16">6</text>
+  
+  <!-- Signal labels -->
+  <text x="80" y="150" text-anchor="end" font-size="20">Clock</text>
+  <text x="80" y="250" text-anchor="end" font-size="20">Data</text>
+  <text x="80" y="350" text-anchor="end" font-size="20">Enable</text>
+  <text x="80" y="450" text-anchor="end" font-size="20">Output</text>
+  
+  <!-- Clock signal -->
+  <polyline points="100,150 100,100 150,100 150,150 200,150 200,100 250,100 250,150 300,150 300,100 350,100 350,150 400,150 400,100 450,100 450,150 500,150 500,100 550,100 550,150 600,150 600,100 650,100 650,150 700,150" 
+            fill="none" stroke="#000000" stroke-width="2"/>
+  
+  <!-- Data signal -->
+  <polyline points="100,250 100,200 200,200 200,250 400,250 400,200 700,200" 
+            fill="none" stroke="#000000" stroke-width="2"/>
+  
+  <!-- Enable signal -->
+  <polyline points="100,350 100,350 300,350 300,300 500,300 500,350 700,350" 
+            fill="none" stroke="#000000" stroke-width="2"/>
+  
+  <!-- Output signal -->
+  <polyline points="100,450 100,450 350,450 350,400 550,400 550,450 700,450" 
+            fill="none" stroke="#000000" stroke-width="2"/>
+</svg>
+""",
+    "Computer Networks": """
+Example 1 - Network node:
+<rect x="200" y="200" width="160" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<text x="280" y="240" text-anchor="middle" dominant-baseline="middle" font-size="24">Router</text>
+
+Example 2 - Network topology:
+<circle cx="400" cy="200" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="300" cy="300" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="500" cy="300" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<line x1="400" y1="200" x2="300" y2="300" stroke="#000000" stroke-width="2"></line>
+<line x1="400" y1="200" x2="500" y2="300" stroke="#000000" stroke-width="2"></line>
+
+Example 3 - Protocol stack:
+<rect x="200" y="200" width="200" height="60" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="200" y="260" width="200" height="60" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="200" y="320" width="200" height="60" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<text x="300" y="230" text-anchor="middle" dominant-baseline="middle" font-size="24">Application</text>
+<text x="300" y="290" text-anchor="middle" dominant-baseline="middle" font-size="24">Transport</text>
+<text x="300" y="350" text-anchor="middle" dominant-baseline="middle" font-size="24">Network</text>
+""",
+    "Machine Learning": """
+Example 1 - Decision tree:
+<rect x="300" y="100" width="200" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<text x="400" y="140" text-anchor="middle" dominant-baseline="middle" font-size="24">Feature X > 0.5</text>
+<line x1="300" y1="180" x2="200" y2="260" stroke="#000000" stroke-width="2"></line>
+<line x1="500" y1="180" x2="600" y2="260" stroke="#000000" stroke-width="2"></line>
+<rect x="100" y="260" width="200" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="500" y="260" width="200" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+
+Example 2 - Neural network:
+<circle cx="200" cy="200" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="200" cy="300" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="200" cy="400" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="400" cy="250" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="400" cy="350" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+<circle cx="600" cy="300" r="30" fill="#FFFFFF" stroke="#000000" stroke-width="2"></circle>
+
+Example 3 - Confusion matrix:
+<rect x="200" y="200" width="100" height="100" fill="#E6F7FF" stroke="#000000" stroke-width="2"></rect>
+<rect x="300" y="200" width="100" height="100" fill="#FFEBE6" stroke="#000000" stroke-width="2"></rect>
+<rect x="200" y="300" width="100" height="100" fill="#FFEBE6" stroke="#000000" stroke-width="2"></rect>
+<rect x="300" y="300" width="100" height="100" fill="#E6F7FF" stroke="#000000" stroke-width="2"></rect>
+<text x="250" y="250" text-anchor="middle" dominant-baseline="middle" font-size="24">TP</text>
+<text x="350" y="250" text-anchor="middle" dominant-baseline="middle" font-size="24">FP</text>
+<text x="250" y="350" text-anchor="middle" dominant-baseline="middle" font-size="24">FN</text>
+<text x="350" y="350" text-anchor="middle" dominant-baseline="middle" font-size="24">TN</text>
+""",
+    "Cloud Computing": """
+Example 1 - Cloud service:
+<path d="M200,200 Q240,160 280,200 Q320,160 360,200 Q400,240 360,280 Q320,320 280,280 Q240,320 200,280 Q160,240 200,200" fill="#FFFFFF" stroke="#000000" stroke-width="2"></path>
+<text x="280" y="240" text-anchor="middle" dominant-baseline="middle" font-size="24">Cloud Service</text>
+
+Example 2 - Service architecture:
+<rect x="100" y="200" width="160" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="400" y="200" width="160" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="700" y="200" width="160" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<line x1="260" y1="240" x2="400" y2="240" stroke="#000000" stroke-width="2" marker-end="url(#arrowhead)"></line>
+<line x1="560" y1="240" x2="700" y2="240" stroke="#000000" stroke-width="2" marker-end="url(#arrowhead)"></line>
+
+Example 3 - Container orchestration:
+<rect x="200" y="100" width="400" height="300" rx="10" fill="#F8F8F8" stroke="#000000" stroke-width="2"></rect>
+<rect x="240" y="160" width="140" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="420" y="160" width="140" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="240" y="280" width="140" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<rect x="420" y="280" width="140" height="80" rx="10" fill="#FFFFFF" stroke="#000000" stroke-width="2"></rect>
+<text x="400" y="130" text-anchor="middle" dominant-baseline="middle" font-size="24">Kubernetes Cluster</text>
+"""
+}
+
+# SVG_EXAMPLES split into individual examples, so prompts can sample them
+SVG_EXAMPLE_LISTS = {subject: split_examples(text) for subject, text in SVG_EXAMPLES.items()}
@@ -0,0 +1,156 @@
+# src/question_bank.py
+import os
+import random
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+from database import db
+
+# Supabase returns at most this many rows per request
+PAGE_SIZE = 1000
+
+# Change counters kept by the triggers in sql/question_bank_versions.sql
+VERSIONS_TABLE = 'question_bank_versions'
+
+
+def iter_rows(table: str, columns: str) -> Iterator[Dict]:
+    """Yield every row of a table in id order, one page per request."""
+    start = 0
+    while True:
+        result = db.client.table(table)\
+            .select(columns)\
+            .order('id')\
+            .range(start, start + PAGE_SIZE - 1)\
+            .execute()
+        rows = result.data or []
+        yield from rows
+        if len(rows) < PAGE_SIZE:
+            break
+        start += PAGE_SIZE
+
+
+# Cleared if the question_bank_versions table is missing
+_versions_table = True
+
+
+class QuestionBank:
+    """
+    Process-wide, in-memory copy of a question table grouped by subject.
+
+    The table is loaded lazily on first use. Afterwards a cheap version
+    check runs at most every `check_interval` seconds and triggers a reload
+    only when the table has changed, so sampling questions is normally a
+    pure in-memory operation. The version is the table's change counter in
+    question_bank_versions, which database triggers bump on every write
+    from any process; without that table it falls back to (row count,
+    max id), which does not notice edits to existing rows.
+    """
+
+    def __init__(self, table: str, columns: str, check_interval: float = 60.0):
+        self.table = table
+        self.columns = columns
+        self.check_interval = check_interval
+        self._by_subject: Dict[str, List[Dict]] = {}
+        self._version: Optional[Tuple] = None
+        self._loaded = False
+        self._last_check = 0.0
+        self._lock = threading.RLock()
+        self.reloads = 0
+        self.version_checks = 0
+
+    def _fetch_version(self) -> Tuple:
+        """Return the table's change counter, or its (row count, max id) fingerprint."""
+        global _versions_table
+        if _versions_table:
+            try:
+                result = db.client.table(VERSIONS_TABLE)\
+                    .select('version')\
+                    .eq('table_name', self.table)\
+                    .limit(1)\
+                    .execute()
+                return ('changes', result.data[0]['version'] if result.data else 0)
+            except Exception as e:
+                if VERSIONS_TABLE in str(e) and ('PGRST205' in str(e) or 'does not exist' in str(e)):
+                    print(f"{VERSIONS_TABLE} table not installed; falling back to row count and max id")
+                    _versions_table = False
+                else:
+                    raise
+
+        result = db.client.table(self.table)\
+            .select('id', count='exact')\
+            .order('id', desc=True)\
+            .limit(1)\
+            .execute()
+        max_id = result.data[0]['id'] if result.data else None
+        return ('fingerprint', result.count or 0, max_id)
+
+    def _load(self) -> Dict[str, List[Dict]]:
+        """Read the whole table page by page and group rows by subject."""
+        by_subject: Dict[str, List[Dict]] = {}
+        for row in iter_rows(self.table, self.columns):
+            by_subject.setdefault(row['subject'], []).append(row)
+        return by_subject
+
+    def is_stale(self) -> bool:
+        """Whether the next read needs to load or re-check the table."""
+        return not self._loaded or time.monotonic() - self._last_check > self.check_interval
+
+    def refresh(self, force: bool = False):
+        """Reload the table if its version changed (or unconditionally with force)."""
+        with self._lock:
+            self.version_checks += 1
+            version = self._fetch_version()
+            self._last_check = time.monotonic()
+            if not force and self._loaded and version == self._version:
+                return
+            self._by_subject = self._load()
+            self._version = version
+            self._loaded = True
+            self.reloads += 1
+            print(f"Loaded {sum(len(rows) for rows in self._by_subject.values())} rows from {self.table}")
+
+    def ensure_fresh(self):
+        if self.is_stale():
+            with self._lock:
+                # Another thread may have refreshed while we waited
+                if self.is_stale():
+                    self.refresh()
+
+    def sample(self, subject: str, count: int, refresh: bool = True) -> List[Dict]:
+        """
+        Pick up to `count` random questions for a subject. With refresh=False
+        the loaded rows are used as they are, without any remote call.
+        """
+        if refresh:
+            self.ensure_fresh()
+        rows = self._by_subject.get(subject, [])
+        return random.sample(rows, min(count, len(rows)))
+
+    def subjects(self) -> List[str]:
+        self.ensure_fresh()
+        return list(self._by_subject.keys())
+
+    def stats(self) -> Dict:
+        return {
+            'loaded': self._loaded,
+            'version': list(self._version) if self._version else None,
+            'rows_by_subject': {subject: len(rows) for subject, rows in self._by_subject.items()},
+            'reloads': self.reloads,
+            'version_checks': self.version_checks
+        }
+
+
+# Only the columns the mock test renders are kept; svg_code is large and
+# only needed for the one diagram question picked per subject, so it is
+# fetched by id when that question is chosen
+mock_question_bank = QuestionBank(
+    'mock_questions',
+    'id, question, options, correct_answer, explanation, subject',
+    check_interval=float(os.getenv('QUESTION_BANK_CHECK_INTERVAL', '60'))
+)
+diagram_question_bank = QuestionBank(
+    'diagram_questions',
+    'id, question, options, correct_answer, explanation, subject',
+    check_interval=float(os.getenv('QUESTION_BANK_CHECK_INTERVAL', '60'))
+)
+
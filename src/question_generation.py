@@ -1,222 +1,270 @@
+import copy
 import json
 import os
-from typing import List, Dict, Optional
+import random
+import re
+from typing import AsyncIterator, List, Dict, Optional
 from datetime import datetime
-from together import Together
 from dotenv import load_dotenv
 import asyncio
+from llm_client import LLMClient, llm_client
+from taxonomy import get_taxonomy
+from llm_parsing import QuestionStreamParser, is_complete_parse, is_complete_payload, parse_questions
+from llm_policy import CallPolicy
+from prompts import DIFFICULTY_GUIDELINES, SUBJECT_PROMPT, SUBTOPIC_PROMPT, TOPIC_SYSTEM_PROMPT
+from single_flight import SingleFlight
+
+# Sampling parameters shared by the blocking and streaming calls
+GENERATION_PARAMS = {
+    'max_tokens': 4000,
+    'temperature': 0.7,
+    'top_p': 0.9,
+    'top_k': 50,
+    'repetition_penalty': 1.1
+}
+
+# Options whose meaning depends on where the other options are
+# ("All of the above", "Both A and B", "Options 1 and 3", ...)
+_POSITIONAL_OPTION = re.compile(
+    r"(?i:\b(?:all|none|both|neither|any) of (?:the )?(?:above|below|these|them|the options)\b)"
+    r"|\b(?:[Bb]oth|[Nn]either|[Oo]nly) (?:[A-D]|\([A-Da-d]\))(?![\w'])"
+    r"|\b[Oo]ptions? \(?[A-D1-4]\)?(?![\w'])"
+    r"|^\(?[A-D]\)? *(?:,|&|and|or|nor) *\(?[A-D]\)?(?![\w'])"
+)
+
+def has_positional_options(question: Dict) -> bool:
+    """Whether any option refers to other options by position or letter."""
+    return any(_POSITIONAL_OPTION.search(str(option)) for option in question['options'])
+
+def personalize_question(question: Dict, rng: Optional[random.Random] = None) -> Dict:
+    """
+    Copy a (possibly shared) question for one user, shuffling its options
+    with `rng` when given and remapping correct_answer to match. Questions
+    with options like "All of the above" keep their order.
+    """
+    question = copy.deepcopy(question)
+    if rng is not None and not has_positional_options(question):
+        order = list(range(len(question['options'])))
+        rng.shuffle(order)
+        question['options'] = [question['options'][i] for i in order]
+        question['correct_answer'] = order.index(question['correct_answer'])
+    return question
 
 class QuestionGenerator:
     def __init__(self, api_key: Optional[str] = None):
-        """Initialize the question generator with Together AI API settings."""
+        """Initialize the question generator on the shared LLM client (or its own, for a specific key)."""
         # Get the directory where this file is located (src)
         current_dir = os.path.dirname(os.path.abspath(__file__))
         # Go one level up to the project root
         self.project_root = os.path.dirname(current_dir)
+        self.topics_path = os.path.join(self.project_root, 'data', 'raw', 'topics.json')
         
         # Load environment variables
         load_dotenv(os.path.join(self.project_root, '.env'))
         
-        # Initialize Together client
+        # Use the shared pooled LLM client unless a specific key is given
         self.api_key = api_key or os.getenv('TOGETHER_API_KEY')
-        self.client = Together(api_key=self.api_key)
+        self.client = LLMClient(api_key=api_key) if api_key else llm_client
         self.model = "meta-llama/Llama-3.3-70B-Instruct-Turbo-Free"
+        
+        # Identical concurrent generations (topic, difficulty, count) share one LLM call
+        self.coalesce = os.getenv('QUESTION_COALESCING', '1') == '1'
+        self.single_flight = SingleFlight()
+        # Deadline, retries on unusable output and circuit breaking for the LLM calls
+        self.policy = CallPolicy('topic_questions')
+
+    @staticmethod
+    def _is_valid_response(content: str) -> bool:
+        """Whether a raw response parses completely into valid questions (worth caching)."""
+        return is_complete_payload(content, ('single',))
+
+    def _build_messages(self, topic: str, num_questions: int, difficulty_level: str):
+        """Resolve the topic and build the chat messages; returns (subject, messages)."""
+        # Parse topic string (format: "Subject - Subtopic" or just "Subject")
+        parts = topic.split(' - ', 1)
+        subject = parts[0]
+        subtopic_title = parts[1] if len(parts) > 1 else None
+        
+        # Look up the subject and subtopic in the shared taxonomy
+        subject_data, target_subtopic = get_taxonomy(self.topics_path).resolve(topic)
+        
+        if not subject_data:
+            raise ValueError(f"Subject {subject} not found")
+        
+        if subtopic_title and not target_subtopic:
+            raise ValueError(f"Subtopic {subtopic_title} not found in {subject}")
+
+        # Trimmed prompts cover a different sample of key points each day;
+        # prompts within the budget are the same every day
+        seed = f"{topic}:{difficulty_level}:{datetime.now().date().isoformat()}"
+
+        # Create prompt based on whether we're generating questions for a specific subtopic or the whole subject
+        if target_subtopic:
+            prompt, _ = SUBTOPIC_PROMPT.render(
+                seed=seed,
+                num_questions=num_questions,
+                subtopic=target_subtopic.title,
+                subject=subject,
+                difficulty_level=difficulty_level,
+                guidelines=DIFFICULTY_GUIDELINES[difficulty_level],
+                key_points=['- ' + point for point in target_subtopic.key_points]
+            )
+        else:
+            # Key points grouped by subtopic, sampled down (keeping every subtopic) if they exceed the prompt budget
+            prompt, _ = SUBJECT_PROMPT.render(
+                seed=seed,
+                num_questions=num_questions,
+                subject=subject,
+                difficulty_level=difficulty_level,
+                guidelines=DIFFICULTY_GUIDELINES[difficulty_level],
+                key_points=[
+                    [f"- [{st.title}] {point}" for point in st.key_points]
+                    for st in subject_data.subtopics
+                ]
+            )
+
+        messages = [
+            {
+                "role": "system",
+                "content": TOPIC_SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+        return subject, messages
+
+    async def generate_questions_for_topic(
+        self,
+        topic: str,
+        num_questions: int = 5,
+        difficulty_level: str = 'beginner',
+        shuffle_seed: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Generate questions for a specific topic.
+
+        Concurrent identical requests share one in-flight generation; every
+        caller gets its own copy, with the options shuffled per `shuffle_seed`
+        (e.g. the user id) when one is given.
+        """
+        rng = random.Random(shuffle_seed) if shuffle_seed is not None else None
+        if self.coalesce:
+            questions = await self.single_flight.do(
+                (topic, difficulty_level, num_questions),
+                lambda: self._generate_questions(topic, num_questions, difficulty_level)
+            )
+        else:
+            questions = await self._generate_questions(topic, num_questions, difficulty_level)
+        return [personalize_question(q, rng) for q in questions]
+
+    async def stream_questions_for_topic(
+        self,
+        topic: str,
+        num_questions: int = 5,
+        difficulty_level: str = 'beginner',
+        shuffle_seed: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """
+        Generate questions for a topic with the provider's streaming API,
+        yielding each question as soon as it is complete and valid.
+        Coalesced and personalized like generate_questions_for_topic.
+        """
+        rng = random.Random(shuffle_seed) if shuffle_seed is not None else None
+        if self.coalesce:
+            questions = self.single_flight.stream(
+                (topic, difficulty_level, num_questions),
+                lambda: self._stream_questions(topic, num_questions, difficulty_level)
+            )
+        else:
+            questions = self._stream_questions(topic, num_questions, difficulty_level)
+        async for q in questions:
+            yield personalize_question(q, rng)
 
-    def _create_prompt(self, topic_data: Dict, num_questions: int = 5) -> str:
-        """Create a prompt for the Llama model based on topic data."""
-        prompt = f"""Generate {num_questions} multiple choice questions for the topic "{topic_data['title']}" based on these key points:
-
-Key points to cover:
-{chr(10).join('- ' + point for point in topic_data['key_points'])}
-
-Format each question as a JSON object with this structure:
-{{
-    "questions": [
-        {{
-            "question": "The technical question text",
-            "options": ["option1", "option2", "option3", "option4"],
-            "correct_answer": 0,  // Index of correct option (0-3)
-            "explanation": "Detailed explanation of why this is the correct answer"
-        }}
-    ]
-}}
-"""
-        return prompt
-
-    async def generate_questions_for_topic(self, topic: str, num_questions: int = 5, difficulty_level: str = 'beginner') -> List[Dict]:
-        """Generate questions for a specific topic."""
+    async def _generate_questions(self, topic: str, num_questions: int, difficulty_level: str) -> List[Dict]:
         try:
-            # Load topics data
-            topics_path = os.path.join(self.project_root, 'data', 'raw', 'topics.json')
-            with open(topics_path, 'r', encoding='utf-8') as f:
-                topics_data = json.load(f)
+            subject, messages = self._build_messages(topic, num_questions, difficulty_level)
             
-            # Parse topic string (format: "Subject - Subtopic" or just "Subject")
-            parts = topic.split(' - ')
-            subject = parts[0]
-            subtopic_title = parts[1] if len(parts) > 1 else None
+            # The cache check, the retry check and the result below share one
+            # parse per response
+            parsed = {}
+            def parse(content: str):
+                if content not in parsed:
+                    parsed[content] = parse_questions(content, ('single',))
+                return parsed[content]
             
-            # Find all subtopics for the subject
-            subject_data = None
-            target_subtopic = None
-            for t in topics_data['topics']:
-                if t['title'] == subject:
-                    subject_data = t
-                    if subtopic_title:
-                        for st in t['subtopics']:
-                            if st['title'] == subtopic_title:
-                                target_subtopic = st
-                                break
-                    break
+            # Make API call
+            content = await self.policy.call(
+                lambda: self.client.chat(
+                    model=self.model,
+                    messages=messages,
+                    cache_scope={'topic': topic, 'difficulty': difficulty_level},
+                    validate=lambda content: is_complete_parse(*parse(content)),
+                    **GENERATION_PARAMS
+                ),
+                accept=lambda content: bool(parse(content)[0])
+            )
             
-            if not subject_data:
-                raise ValueError(f"Subject {subject} not found")
+            # Recovers every valid question, even from a truncated response
+            valid_questions, parser = parse(content)
             
-            if subtopic_title and not target_subtopic:
-                raise ValueError(f"Subtopic {subtopic_title} not found in {subject}")
-
-            # Define difficulty-specific instructions
-            difficulty_guidelines = {
-                'beginner': """
-                    - Focus on basic definitions and core concepts
-                    - Use straightforward questions testing fundamental understanding
-                    - Avoid complex scenarios or multi-step problems
-                    - Include simple application of concepts
-                    - Use clear and direct language
-                """,
-                'intermediate': """
-                    - Combine multiple concepts in questions
-                    - Include practical applications and case studies
-                    - Test analytical thinking and problem-solving
-                    - Use moderately complex scenarios
-                    - Require deeper understanding of relationships between concepts
-                """,
-                'advanced': """
-                    - Present complex scenarios requiring deep analysis
-                    - Include edge cases and special conditions
-                    - Require integration of multiple concepts
-                    - Test advanced problem-solving abilities
-                    - Include GATE exam level complexity
-                    - Focus on optimization and best practices
-                """
-            }
+            if parser.objects_seen == 0:
+                raise ValueError("Invalid JSON response from API")
+            if parser.rejected:
+                print(f"Rejected {len(parser.rejected)} generated question(s) for {topic}: {parser.rejected}")
+            if not valid_questions:
+                raise ValueError("No valid questions found in response")
             
-            # Create prompt based on whether we're generating questions for a specific subtopic or the whole subject
-            if target_subtopic:
-                # Generate questions for specific subtopic
-                prompt = f"""You are a technical question generator for GATE exam preparation.
-Generate {num_questions} multiple choice questions for the subtopic "{target_subtopic['title']}" in subject "{subject}".
-
-Current difficulty level is {difficulty_level}. Follow these guidelines for this level:
-{difficulty_guidelines[difficulty_level]}
-
-Key points to cover:
-{chr(10).join('- ' + point for point in target_subtopic['key_points'])}
-
-Important Instructions:
-1. Questions MUST match the {difficulty_level} difficulty level guidelines above
-2. Each question should be more challenging than beginner level questions
-3. Include practical applications and real-world scenarios
-4. Ensure explanations are detailed and educational
-
-Return ONLY a JSON object with this exact structure:
-{{
-    "questions": [
-        {{
-            "question": "question text here",
-            "options": ["option1", "option2", "option3", "option4"],
-            "correct_answer": 0,
-            "explanation": "explanation here"
-        }}
-    ]
-}}"""
-            else:
-                # Generate questions for the whole subject
-                all_key_points = []
-                for st in subject_data['subtopics']:
-                    all_key_points.extend([f"[{st['title']}] {point}" for point in st['key_points']])
-                
-                prompt = f"""You are a technical question generator for GATE exam preparation.
-Generate {num_questions} multiple choice questions for the subject "{subject}".
-
-Current difficulty level is {difficulty_level}. Follow these guidelines for this level:
-{difficulty_guidelines[difficulty_level]}
-
-Key points to cover across subtopics:
-{chr(10).join('- ' + point for point in all_key_points)}
-
-Important Instructions:
-1. Questions MUST match the {difficulty_level} difficulty level guidelines above
-2. Each question should be more challenging than beginner level questions
-3. Include practical applications and real-world scenarios
-4. Ensure explanations are detailed and educational
-5. Generate questions that cover different subtopics
-6. Make sure questions are balanced across subtopics
-7. Include the subtopic name in the explanation when relevant
-
-Return ONLY a JSON object with this exact structure:
-{{
-    "questions": [
-        {{
-            "question": "question text here",
-            "options": ["option1", "option2", "option3", "option4"],
-            "correct_answer": 0,
-            "explanation": "explanation here"
-        }}
-    ]
-}}"""            
+            # Add metadata to questions
+            for q in valid_questions:
+                q['topic'] = topic  # Use full topic string
+                q['subject'] = subject
             
-            # Make API call
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a technical question generator specialized in creating GATE exam questions. You must respond with a complete, valid JSON object containing questions. Your response must be a properly formatted JSON with no additional text."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=4000,
-                temperature=0.7,
-                top_p=0.9,
-                top_k=50,
-                repetition_penalty=1.1,
-                stop=None
-            )
+            return valid_questions
             
-            # Extract content from response
-            content = response.choices[0].message.content.strip()
+        except Exception as e:
+            print(f"Error generating questions: {str(e)}")
+            raise Exception(f"Failed to generate questions: {str(e)}")
+
+    async def _stream_questions(self, topic: str, num_questions: int, difficulty_level: str) -> AsyncIterator[Dict]:
+        try:
+            subject, messages = self._build_messages(topic, num_questions, difficulty_level)
+            parser = QuestionStreamParser(('single',))
+            yielded = 0
+            
+            async for delta in self.policy.stream(lambda: self.client.stream_chat(
+                model=self.model,
+                messages=messages,
+                cache_scope={'topic': topic, 'difficulty': difficulty_level},
+                validate=self._is_valid_response,
+                **GENERATION_PARAMS
+            )):
+                for q in parser.feed(delta):
+                    q['topic'] = topic
+                    q['subject'] = subject
+                    yielded += 1
+                    yield q
+            for q in parser.feed('\n'):  # flush a held-back trailing character
+                q['topic'] = topic
+                q['subject'] = subject
+                yielded += 1
+                yield q
             
-            try:
-                # Parse JSON directly
-                questions_data = json.loads(content)
-                
-                if not isinstance(questions_data, dict) or 'questions' not in questions_data:
-                    raise ValueError("Response is not in the expected format")
-                
-                # Validate and add metadata to questions
-                valid_questions = []
-                for q in questions_data['questions']:
-                    if all(key in q for key in ['question', 'options', 'correct_answer', 'explanation']):
-                        q['topic'] = topic  # Use full topic string
-                        q['subject'] = subject
-                        valid_questions.append(q)
-                
-                if not valid_questions:
-                    raise ValueError("No valid questions found in response")
-                
-                return valid_questions
-                
-            except json.JSONDecodeError:
+            if parser.objects_seen == 0:
                 raise ValueError("Invalid JSON response from API")
+            if parser.rejected:
+                print(f"Rejected {len(parser.rejected)} generated question(s) for {topic}: {parser.rejected}")
+            if not yielded:
+                raise ValueError("No valid questions found in response")
             
         except Exception as e:
             print(f"Error generating questions: {str(e)}")
             raise Exception(f"Failed to generate questions: {str(e)}")
 
+    def stats(self) -> Dict:
+        return {'coalescing': self.coalesce, **self.single_flight.stats()}
+
 def main():
     """Test the question generator."""
     async def test():
@@ -0,0 +1,261 @@
+# src/question_inventory.py
+import asyncio
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+from event_loop import background_loop
+
+# Question types kept in stock, with the generator keyword that produces them
+STOCKED_TYPES = {
+    'multiple_answer': 'num_multiple',
+    'numerical': 'num_numerical'
+}
+
+
+class QuestionInventory:
+    """
+    Local stock of pre-generated advanced questions per subject.
+
+    Mock tests take questions from the stock; a background worker tops each
+    subject back up whenever it falls below the low watermark. The stock
+    lives in SQLite, so every worker process shares one stock: a question
+    taken by one process is gone for all of them, and for the next start.
+    Refills are claimed per subject so concurrent workers don't generate
+    the same shortfall twice.
+    """
+
+    def __init__(
+        self,
+        subjects: List[str],
+        generate: Callable[..., Awaitable[List[Dict]]],
+        path: Optional[str] = None,
+        low_watermark: int = 4,
+        high_watermark: int = 12,
+        batch_size: int = 4,
+        refill_interval: float = 30.0,
+        claim_timeout: float = 300.0
+    ):
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        if path is None:
+            path = os.path.join(project_root, 'data', 'processed', 'question_inventory.db')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self.generate = generate
+        self.low_watermark = low_watermark
+        self.high_watermark = high_watermark
+        self.batch_size = batch_size
+        self.refill_interval = refill_interval
+        self.claim_timeout = claim_timeout
+        self.subjects = list(subjects)
+
+        self.counters = {
+            subject: {'taken': 0, 'refilled': 0, 'generation_calls': 0, 'last_refill': None}
+            for subject in subjects
+        }
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS stock (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                subject TEXT NOT NULL,
+                q_type TEXT NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_stock_subject_type ON stock (subject, q_type, id);
+            CREATE TABLE IF NOT EXISTS refill_claims (
+                subject TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL
+            );
+        """)
+
+        # Stock saved next to the database by earlier versions, as JSON
+        self.import_json(f"{os.path.splitext(path)[0]}.json")
+        atexit.register(self.stop)
+
+    def import_json(self, json_path: str):
+        """Move a JSON stock file into the database; the file is renamed first, so only one process imports it."""
+        imported_path = f"{json_path}.imported"
+        try:
+            os.replace(json_path, imported_path)
+        except FileNotFoundError:
+            return
+        try:
+            with open(imported_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except Exception as e:
+            print(f"Error loading question inventory: {str(e)}")
+            return
+
+        for subject, by_type in saved.items():
+            if subject in self.counters:
+                for questions in by_type.values():
+                    self.add(subject, questions)
+
+    def _levels(self, subject: str) -> Dict[str, int]:
+        rows = self._conn.execute(
+            'SELECT q_type, COUNT(*) FROM stock WHERE subject = ? GROUP BY q_type', (subject,)
+        ).fetchall()
+        levels = {q_type: 0 for q_type in STOCKED_TYPES}
+        levels.update(dict(rows))
+        return levels
+
+    def take(self, subject: str, num_multiple: int = 0, num_numerical: int = 0) -> List[Dict]:
+        """Take up to the requested number of questions from stock."""
+        if subject not in self.counters:
+            return []
+        wanted = {'multiple_answer': num_multiple, 'numerical': num_numerical}
+        taken = []
+        with self._lock:
+            # Select and delete in one write transaction, so no two processes get the same question
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for q_type, count in wanted.items():
+                    if count <= 0:
+                        continue
+                    rows = self._conn.execute(
+                        'SELECT id, data FROM stock WHERE subject = ? AND q_type = ? ORDER BY id LIMIT ?',
+                        (subject, q_type, count)
+                    ).fetchall()
+                    self._conn.executemany('DELETE FROM stock WHERE id = ?', [(row[0],) for row in rows])
+                    taken.extend(json.loads(row[1]) for row in rows)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            if taken:
+                self.counters[subject]['taken'] += len(taken)
+                if any(level < self.low_watermark for level in self._levels(subject).values()):
+                    self._wake.set()
+        return taken
+
+    def add(self, subject: str, questions: List[Dict]) -> int:
+        """Add generated questions to the stock; returns how many were stocked."""
+        if subject not in self.counters:
+            return 0
+        added = 0
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                levels = self._levels(subject)
+                for q in questions:
+                    q_type = q.get('type')
+                    if q_type in levels and levels[q_type] < self.high_watermark:
+                        self._conn.execute(
+                            'INSERT INTO stock (subject, q_type, data) VALUES (?, ?, ?)',
+                            (subject, q_type, json.dumps(q))
+                        )
+                        levels[q_type] += 1
+                        added += 1
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            if added:
+                self.counters[subject]['refilled'] += added
+                self.counters[subject]['last_refill'] = time.time()
+        return added
+
+    def shortfall(self, subject: str) -> Dict[str, int]:
+        """How many questions of each type are needed to reach the high watermark."""
+        with self._lock:
+            levels = self._levels(subject)
+        if all(level >= self.low_watermark for level in levels.values()):
+            return {}
+        return {q_type: max(0, self.high_watermark - level) for q_type, level in levels.items()}
+
+    def _claim(self, subject: str) -> bool:
+        """Claim the refill of a subject for this process; expires after `claim_timeout`."""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO refill_claims (subject, expires_at) VALUES (?, ?)
+                ON CONFLICT (subject) DO UPDATE SET expires_at = excluded.expires_at
+                WHERE refill_claims.expires_at <= ?
+                """,
+                (subject, now + self.claim_timeout, now)
+            )
+            return cursor.rowcount > 0
+
+    def _release(self, subject: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM refill_claims WHERE subject = ?', (subject,))
+
+    async def refill_once(self):
+        """Top up every subject that is below the low watermark."""
+        for subject in self.subjects:
+            if self._stop.is_set():
+                break
+            # SQLite calls stay off the shared event loop
+            needed = await asyncio.to_thread(self.shortfall, subject)
+            if not needed or not await asyncio.to_thread(self._claim, subject):
+                continue
+            kwargs = {
+                STOCKED_TYPES[q_type]: min(count, self.batch_size)
+                for q_type, count in needed.items()
+            }
+            try:
+                self.counters[subject]['generation_calls'] += 1
+                questions = await self.generate(subject, **kwargs)
+                added = await asyncio.to_thread(self.add, subject, questions)
+                print(f"Inventory refill for {subject}: stocked {added} question(s)")
+            except Exception as e:
+                print(f"Inventory refill failed for {subject}: {str(e)}")
+            finally:
+                await asyncio.to_thread(self._release, subject)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Generate on the shared loop so the pooled LLM client is reused
+            try:
+                background_loop.run(self.refill_once())
+            except Exception as e:
+                print(f"Inventory refill cycle failed: {str(e)}")
+            self._wake.wait(self.refill_interval)
+            self._wake.clear()
+
+    def start(self):
+        """Start the background refill worker (idempotent)."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name='question-inventory', daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        """Stop the refill worker (also run at exit); the stock is already on disk."""
+        self._stop.set()
+        self._wake.set()
+
+    def stats(self) -> Dict:
+        """Report stock levels and refill rates per subject."""
+        elapsed_minutes = max((time.time() - self.started_at) / 60, 1e-9)
+        with self._lock:
+            levels = {subject: self._levels(subject) for subject in self.subjects}
+            return {
+                'low_watermark': self.low_watermark,
+                'high_watermark': self.high_watermark,
+                'worker_running': self._worker is not None and self._worker.is_alive(),
+                'subjects': {
+                    subject: {
+                        'stock': levels[subject],
+                        'taken': self.counters[subject]['taken'],
+                        'refilled': self.counters[subject]['refilled'],
+                        'generation_calls': self.counters[subject]['generation_calls'],
+                        'refill_per_minute': round(self.counters[subject]['refilled'] / elapsed_minutes, 2),
+                        'last_refill': self.counters[subject]['last_refill']
+                    }
+                    for subject in self.subjects
+                }
+            }
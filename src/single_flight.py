@@ -0,0 +1,104 @@
+# src/single_flight.py
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class _SharedStream:
+    """Items of one in-flight stream, replayed to every subscriber."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Condition()
+
+    async def pump(self, source: AsyncIterator):
+        try:
+            async for item in source:
+                self.items.append(item)
+                async with self.changed:
+                    self.changed.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            async with self.changed:
+                self.changed.notify_all()
+
+    async def subscribe(self) -> AsyncIterator:
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            async with self.changed:
+                await self.changed.wait_for(lambda: len(self.items) > index or self.done)
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent calls into one.
+
+    The first caller for a key starts the call (the leader); callers that
+    arrive while it is in flight wait for the same result instead of
+    starting their own. Streams are shared the same way: late subscribers
+    first replay the items produced so far. The shared call runs as its own
+    task, so a caller that goes away does not cancel it for the others.
+    Calls are tracked per event loop, since their futures belong to one.
+    """
+
+    def __init__(self):
+        self._calls: Dict[tuple, asyncio.Future] = {}
+        self._streams: Dict[tuple, _SharedStream] = {}
+        self.counters = {'calls': 0, 'coalesced': 0, 'errors': 0}
+
+    def _finished(self, registry: Dict, key: tuple, value, failed: bool):
+        if registry.get(key) is value:
+            del registry[key]
+        if failed:
+            self.counters['errors'] += 1
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        """Await fn(), or the identical call already in flight for `key`."""
+        key = (asyncio.get_running_loop(), key)
+        task = self._calls.get(key)
+        if task is None:
+            self.counters['calls'] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t: self._finished(
+                self._calls, key, t, not t.cancelled() and t.exception() is not None
+            ))
+        else:
+            self.counters['coalesced'] += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key: Hashable, fn: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Iterate fn(), or subscribe to the identical stream already in flight for `key`."""
+        key = (asyncio.get_running_loop(), key)
+        shared = self._streams.get(key)
+        if shared is None:
+            self.counters['calls'] += 1
+            shared = _SharedStream()
+            self._streams[key] = shared
+            task = asyncio.ensure_future(shared.pump(fn()))
+            task.add_done_callback(lambda _: self._finished(
+                self._streams, key, shared, shared.error is not None
+            ))
+        else:
+            self.counters['coalesced'] += 1
+        async for item in shared.subscribe():
+            yield item
+
+    def stats(self) -> Dict:
+        calls = self.counters['calls']
+        coalesced = self.counters['coalesced']
+        return {
+            **self.counters,
+            'in_flight': len(self._calls) + len(self._streams),
+            'coalesced_ratio': round(coalesced / (calls + coalesced), 3) if calls + coalesced else None
+        }
@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+# src/state_store.py
+import argparse
+import atexit
+import copy
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+
+def default_topic_stats() -> Dict:
+    return {
+        'score': 0.0,
+        'attempts': 0,
+        'correct': 0,
+        'last_attempt': None,
+        'difficulty_level': 'beginner',
+        'mastered': False,
+        'subtopics': {}
+    }
+
+
+class UserState(dict):
+    """
+    A user's state document that tracks its own modifications.
+
+    Assigning a top-level field marks it dirty only when the value actually
+    changes; nested topic entries must be flagged with `mark_topic_dirty`.
+    A freshly initialized state is not persisted until something changes.
+    """
+
+    def __init__(self, data: Dict, persisted: bool = True):
+        super().__init__(data)
+        self.persisted = persisted
+        self.dirty_fields: Set[str] = set()
+        self.dirty_topics: Set[str] = set()
+
+    def __setitem__(self, key, value):
+        if key not in self or self[key] != value:
+            self.dirty_fields.add(key)
+        super().__setitem__(key, value)
+
+    def mark_topic_dirty(self, topic: str):
+        self.dirty_topics.add(topic)
+
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self.dirty_fields or self.dirty_topics)
+
+    def mark_clean(self):
+        self.dirty_fields.clear()
+        self.dirty_topics.clear()
+        self.persisted = True
+
+
+class StateStore(ABC):
+    """Interface for persisting adaptive learning state per user."""
+
+    @abstractmethod
+    def load(self, user_id: str) -> Optional[Dict]:
+        """Return the user's state document, or None if none is stored."""
+
+    def load_many(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+        """Return the stored state of many users, keyed by user id."""
+        states = {}
+        for user_id in user_ids:
+            state = self.load(user_id)
+            if state is not None:
+                states[user_id] = state
+        return states
+
+    @abstractmethod
+    def save(self, user_id: str, state: Dict, topics: Optional[Iterable[str]] = None):
+        """Persist a state document; `topics` limits which topic entries are written."""
+
+    @abstractmethod
+    def update_topic(self, user_id: str, topic: str, update: Callable[[Dict], Any]) -> Any:
+        """Atomically read, modify (in place via `update`) and write one topic entry."""
+
+    @abstractmethod
+    def delete(self, user_id: str):
+        ...
+
+    @abstractmethod
+    def user_ids(self) -> List[str]:
+        ...
+
+
+class JSONStateStore(StateStore):
+    """One `user_{id}_state.json` document per user (the original format)."""
+
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self._locks = defaultdict(threading.Lock)
+
+    def _path(self, user_id: str) -> str:
+        return os.path.join(self.state_dir, f'user_{user_id}_state.json')
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        path = self._path(user_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def save(self, user_id: str, state: Dict, topics: Optional[Iterable[str]] = None):
+        # The document format can only be rewritten as a whole
+        tmp_path = f"{self._path(user_id)}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self._path(user_id))
+
+    def update_topic(self, user_id: str, topic: str, update: Callable[[Dict], Any]) -> Any:
+        with self._locks[user_id]:
+            state = self.load(user_id) or {'user_id': user_id, 'topic_scores': {}}
+            stats = state['topic_scores'].setdefault(topic, default_topic_stats())
+            result = update(stats)
+            self.save(user_id, state)
+            return result
+
+    def delete(self, user_id: str):
+        path = self._path(user_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def user_ids(self) -> List[str]:
+        return [
+            name[len('user_'):-len('_state.json')]
+            for name in os.listdir(self.state_dir)
+            if name.startswith('user_') and name.endswith('_state.json')
+        ]
+
+
+class SQLiteStateStore(StateStore):
+    """
+    Embedded SQLite (WAL) backend with one row per (user, topic).
+
+    Updating a topic touches a single row inside an immediate transaction,
+    so concurrent requests for the same user can no longer lose updates.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS user_state (
+                user_id TEXT PRIMARY KEY,
+                current_level INTEGER NOT NULL DEFAULT 1,
+                learning_path TEXT NOT NULL DEFAULT '[]',
+                questions_answered TEXT NOT NULL DEFAULT '[]',
+                timestamp TEXT
+            );
+            CREATE TABLE IF NOT EXISTS topic_scores (
+                user_id TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                score REAL NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                last_attempt TEXT,
+                difficulty_level TEXT NOT NULL DEFAULT 'beginner',
+                mastered INTEGER NOT NULL DEFAULT 0,
+                subtopics TEXT NOT NULL DEFAULT '{}',
+                PRIMARY KEY (user_id, topic)
+            );
+        """)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the writer."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _topic_row(row: sqlite3.Row) -> Dict:
+        return {
+            'score': row['score'],
+            'attempts': row['attempts'],
+            'correct': row['correct'],
+            'last_attempt': row['last_attempt'],
+            'difficulty_level': row['difficulty_level'],
+            'mastered': bool(row['mastered']),
+            'subtopics': json.loads(row['subtopics'])
+        }
+
+    @staticmethod
+    def _topic_values(user_id: str, topic: str, stats: Dict) -> tuple:
+        return (
+            user_id,
+            topic,
+            stats.get('score', 0.0),
+            stats.get('attempts', 0),
+            stats.get('correct', 0),
+            stats.get('last_attempt'),
+            stats.get('difficulty_level', 'beginner'),
+            int(bool(stats.get('mastered', False))),
+            json.dumps(stats.get('subtopics', {}))
+        )
+
+    def _upsert_topic(self, conn: sqlite3.Connection, user_id: str, topic: str, stats: Dict):
+        conn.execute("""
+            INSERT INTO topic_scores
+                (user_id, topic, score, attempts, correct, last_attempt, difficulty_level, mastered, subtopics)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (user_id, topic) DO UPDATE SET
+                score = excluded.score,
+                attempts = excluded.attempts,
+                correct = excluded.correct,
+                last_attempt = excluded.last_attempt,
+                difficulty_level = excluded.difficulty_level,
+                mastered = excluded.mastered,
+                subtopics = excluded.subtopics
+        """, self._topic_values(user_id, topic, stats))
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        return self.load_many([user_id]).get(user_id)
+
+    def load_many(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+        user_ids = list(user_ids)
+        conn = self._conn()
+        states: Dict[str, Dict] = {}
+
+        # Stay well below SQLite's bound-parameter limit
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(
+                f'SELECT * FROM user_state WHERE user_id IN ({placeholders})', chunk
+            ):
+                states[row['user_id']] = {
+                    'user_id': row['user_id'],
+                    'topic_scores': {},
+                    'questions_answered': json.loads(row['questions_answered']),
+                    'learning_path': json.loads(row['learning_path']),
+                    'current_level': row['current_level'],
+                    'timestamp': row['timestamp']
+                }
+            for row in conn.execute(
+                f'SELECT * FROM topic_scores WHERE user_id IN ({placeholders}) ORDER BY rowid', chunk
+            ):
+                state = states.setdefault(row['user_id'], {
+                    'user_id': row['user_id'],
+                    'topic_scores': {},
+                    'questions_answered': [],
+                    'learning_path': [],
+                    'current_level': 1,
+                    'timestamp': None
+                })
+                state['topic_scores'][row['topic']] = self._topic_row(row)
+        return states
+
+    def save(self, user_id: str, state: Dict, topics: Optional[Iterable[str]] = None):
+        conn = self._conn()
+        topic_scores = state.get('topic_scores', {})
+        topics = topic_scores.keys() if topics is None else topics
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("""
+                INSERT INTO user_state (user_id, current_level, learning_path, questions_answered, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    current_level = excluded.current_level,
+                    learning_path = excluded.learning_path,
+                    questions_answered = excluded.questions_answered,
+                    timestamp = excluded.timestamp
+            """, (
+                user_id,
+                state.get('current_level', 1),
+                json.dumps(state.get('learning_path', [])),
+                json.dumps(state.get('questions_answered', [])),
+                state.get('timestamp')
+            ))
+            for topic in topics:
+                if topic in topic_scores:
+                    self._upsert_topic(conn, user_id, topic, topic_scores[topic])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def update_topic(self, user_id: str, topic: str, update: Callable[[Dict], Any]) -> Any:
+        conn = self._conn()
+        # BEGIN IMMEDIATE takes the write lock before reading, so two
+        # concurrent updates of the same topic are serialized
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT * FROM topic_scores WHERE user_id = ? AND topic = ?', (user_id, topic)
+            ).fetchone()
+            stats = self._topic_row(row) if row is not None else default_topic_stats()
+            result = update(stats)
+            conn.execute('INSERT OR IGNORE INTO user_state (user_id) VALUES (?)', (user_id,))
+            self._upsert_topic(conn, user_id, topic, stats)
+            conn.execute('COMMIT')
+            return result
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def delete(self, user_id: str):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('DELETE FROM topic_scores WHERE user_id = ?', (user_id,))
+        conn.execute('DELETE FROM user_state WHERE user_id = ?', (user_id,))
+        conn.execute('COMMIT')
+
+    def user_ids(self) -> List[str]:
+        return [row['user_id'] for row in self._conn().execute('SELECT user_id FROM user_state')]
+
+
+class WriteBehindStore(StateStore):
+    """
+    Buffers saves in memory and writes them to the wrapped store in batches.
+
+    Bursts of saves for the same user within `delay` seconds coalesce into a
+    single write. Reads see pending state, atomic topic updates flush the
+    user first, and everything still pending is flushed at interpreter exit.
+    """
+
+    def __init__(self, store: StateStore, delay: float = 2.0):
+        self.store = store
+        self.delay = delay
+        self._pending: Dict[str, Tuple[Dict, Optional[Set[str]]]] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self.counters = {'saves': 0, 'writes': 0, 'flushes': 0}
+        atexit.register(self.flush)
+
+    def save(self, user_id: str, state: Dict, topics: Optional[Iterable[str]] = None):
+        snapshot = copy.deepcopy(dict(state))
+        with self._lock:
+            topics = None if topics is None else set(topics)
+            previous = self._pending.get(user_id)
+            if previous is not None:
+                # None means "all topics" and absorbs any narrower set
+                topics = None if topics is None or previous[1] is None else topics | previous[1]
+            self._pending[user_id] = (snapshot, topics)
+            self.counters['saves'] += 1
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self, user_id: Optional[str] = None):
+        """Write pending state for one user, or for everyone."""
+        with self._lock:
+            if user_id is None:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            elif user_id in self._pending:
+                pending = {user_id: self._pending.pop(user_id)}
+            else:
+                return
+            self.counters['flushes'] += 1
+
+        for pending_user, (state, topics) in pending.items():
+            try:
+                self.store.save(pending_user, state, topics)
+                self.counters['writes'] += 1
+            except Exception as e:
+                print(f"Error flushing state for user {pending_user}: {str(e)}")
+
+    def load(self, user_id: str) -> Optional[Dict]:
+        with self._lock:
+            pending = self._pending.get(user_id)
+            if pending is not None:
+                return copy.deepcopy(pending[0])
+        return self.store.load(user_id)
+
+    def load_many(self, user_ids: Iterable[str]) -> Dict[str, Dict]:
+        user_ids = list(user_ids)
+        states = self.store.load_many(user_ids)
+        with self._lock:
+            for user_id in user_ids:
+                if user_id in self._pending:
+                    states[user_id] = copy.deepcopy(self._pending[user_id][0])
+        return states
+
+    def update_topic(self, user_id: str, topic: str, update: Callable[[Dict], Any]) -> Any:
+        self.flush(user_id)
+        return self.store.update_topic(user_id, topic, update)
+
+    def delete(self, user_id: str):
+        with self._lock:
+            self._pending.pop(user_id, None)
+        self.store.delete(user_id)
+
+    def user_ids(self) -> List[str]:
+        with self._lock:
+            pending = list(self._pending)
+        return list(dict.fromkeys(self.store.user_ids() + pending))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self.counters, 'pending': len(self._pending), 'delay': self.delay}
+
+
+def create_state_store(data_dir: str, backend: Optional[str] = None) -> StateStore:
+    """
+    Build the configured backend (ADAPTIVE_STATE_BACKEND: 'sqlite' or 'json'),
+    wrapped in a write-behind buffer when ADAPTIVE_STATE_WRITE_BEHIND > 0 seconds.
+    An empty SQLite store first imports the JSON states of earlier versions.
+    """
+    backend = backend or os.getenv('ADAPTIVE_STATE_BACKEND', 'sqlite')
+    state_dir = os.path.join(data_dir, 'adaptive_state')
+    if backend == 'json':
+        store = JSONStateStore(state_dir)
+    elif backend == 'sqlite':
+        store = SQLiteStateStore(os.path.join(state_dir, 'adaptive_state.db'))
+        json_store = JSONStateStore(state_dir)
+        if not store.user_ids() and json_store.user_ids():
+            migrated = migrate_json_states(json_store, store)
+            print(f"Imported {migrated} JSON user state(s) into {store.db_path}")
+    else:
+        raise ValueError(f"Unknown adaptive state backend: {backend}")
+
+    write_behind = float(os.getenv('ADAPTIVE_STATE_WRITE_BEHIND', '0'))
+    if write_behind > 0:
+        store = WriteBehindStore(store, delay=write_behind)
+    return store
+
+
+def migrate_json_states(source: JSONStateStore, target: StateStore) -> int:
+    """Copy every JSON state document into another backend."""
+    migrated = 0
+    for user_id in source.user_ids():
+        try:
+            target.save(user_id, source.load(user_id))
+            migrated += 1
+        except Exception as e:
+            print(f"Error migrating state for user {user_id}: {str(e)}")
+    return migrated
+
+
+def main():
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    data_dir = os.path.join(project_root, 'data')
+
+    parser = argparse.ArgumentParser(description="Manage the adaptive learning state store.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate = subparsers.add_parser('migrate', help="Copy data/adaptive_state/*.json into SQLite")
+    migrate.add_argument('--state-dir', default=os.path.join(data_dir, 'adaptive_state'))
+    migrate.add_argument('--db', default=os.path.join(data_dir, 'adaptive_state', 'adaptive_state.db'))
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        source = JSONStateStore(args.state_dir)
+        target = SQLiteStateStore(args.db)
+        migrated = migrate_json_states(source, target)
+        print(f"Migrated {migrated} user state(s) into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# src/stored_tests.py
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+from cache import TTLCache
+
+
+class TestStore(ABC):
+    """
+    Server-side storage for tests in progress, keyed by an opaque id.
+
+    Only the id goes into the (cookie) session; the questions stay on the
+    server, so answers can be graded against them on submission.
+    """
+
+    def create(self, test: Dict) -> str:
+        test_id = secrets.token_urlsafe(16)
+        self.put(test_id, test)
+        return test_id
+
+    @abstractmethod
+    def put(self, test_id: str, test: Dict):
+        ...
+
+    @abstractmethod
+    def get(self, test_id: str) -> Optional[Dict]:
+        ...
+
+    @abstractmethod
+    def delete(self, test_id: str):
+        ...
+
+    @abstractmethod
+    def stats(self) -> Dict:
+        ...
+
+
+class MemoryTestStore(TestStore):
+    """
+    In-process store; tests expire after `ttl` seconds or LRU eviction.
+    Only safe with a single worker process, since other workers cannot
+    see its tests.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.cache = TTLCache(ttl=ttl, max_size=max_size)
+
+    def put(self, test_id: str, test: Dict):
+        self.cache.set(test_id, test)
+
+    def get(self, test_id: str) -> Optional[Dict]:
+        return self.cache.get(test_id)
+
+    def delete(self, test_id: str):
+        self.cache.invalidate(test_id)
+
+    def stats(self) -> Dict:
+        return {'backend': 'memory', 'ttl': self.cache.ttl, **self.cache.stats()}
+
+
+class SQLiteTestStore(TestStore):
+    """Local SQLite store, shared by worker processes and surviving restarts."""
+
+    def __init__(self, path: str, ttl: float):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tests (
+                test_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_tests_expires_at ON tests (expires_at)')
+        self._conn.commit()
+
+    def put(self, test_id: str, test: Dict):
+        now = time.time()
+        with self._lock:
+            # Purge expired tests as new ones come in
+            self._conn.execute('DELETE FROM tests WHERE expires_at <= ?', (now,))
+            self._conn.execute(
+                'INSERT OR REPLACE INTO tests (test_id, data, expires_at) VALUES (?, ?, ?)',
+                (test_id, json.dumps(test), now + self.ttl)
+            )
+            self._conn.commit()
+
+    def get(self, test_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM tests WHERE test_id = ? AND expires_at > ?',
+                (test_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, test_id: str):
+        with self._lock:
+            self._conn.execute('DELETE FROM tests WHERE test_id = ?', (test_id,))
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            active = self._conn.execute(
+                'SELECT COUNT(*) FROM tests WHERE expires_at > ?', (time.time(),)
+            ).fetchone()[0]
+        return {'backend': 'sqlite', 'ttl': self.ttl, 'active': active}
+
+
+def create_test_store() -> TestStore:
+    """
+    Build the configured store (TEST_STORE_BACKEND: 'sqlite' or 'memory').
+    SQLite is the default because it is shared by all worker processes.
+    """
+    backend = os.getenv('TEST_STORE_BACKEND', 'sqlite')
+    ttl = float(os.getenv('TEST_STORE_TTL', str(2 * 3600)))
+    if backend == 'memory':
+        return MemoryTestStore(ttl=ttl, max_size=int(os.getenv('TEST_STORE_SIZE', '10000')))
+    if backend == 'sqlite':
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        return SQLiteTestStore(os.path.join(project_root, 'data', 'processed', 'tests.db'), ttl=ttl)
+    raise ValueError(f"Unknown test store backend: {backend}")
+
+
+test_store = create_test_store()
@@ -0,0 +1,120 @@
+# src/taxonomy.py
+import json
+import os
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Dict, Optional, Tuple
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPICS_PATH = os.path.join(project_root, 'data', 'raw', 'topics.json')
+
+Subject = namedtuple('Subject', ['id', 'title', 'subtopics'])
+Subtopic = namedtuple('Subtopic', ['id', 'key', 'subject', 'title', 'key_points', 'examples'])
+
+
+def _freeze(value):
+    """Recursively turn parsed JSON into read-only mappings and tuples."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    """Recursively copy a frozen structure back into plain dicts and lists."""
+    if isinstance(value, MappingProxyType):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class Taxonomy:
+    """
+    Immutable, indexed view of the subject/subtopic taxonomy in topics.json.
+
+    Subjects are looked up by title or id, subtopics by their
+    "Subject - Subtopic" key or id, all in O(1).
+    """
+
+    def __init__(self, data: Dict, mtime: float = 0.0):
+        self.mtime = mtime
+        # Read-only copy of the raw document, e.g. for templates
+        self.data = _freeze(data)
+
+        subjects = []
+        subtopics = []
+        for topic in data.get('topics', []):
+            topic_subtopics = []
+            for st in topic.get('subtopics', []):
+                subtopic = Subtopic(
+                    id=len(subtopics),
+                    key=f"{topic['title']} - {st['title']}",
+                    subject=topic['title'],
+                    title=st['title'],
+                    key_points=tuple(st.get('key_points', [])),
+                    examples=tuple(st.get('examples', []))
+                )
+                subtopics.append(subtopic)
+                topic_subtopics.append(subtopic)
+            subjects.append(Subject(id=len(subjects), title=topic['title'], subtopics=tuple(topic_subtopics)))
+
+        self.subjects: Tuple[Subject, ...] = tuple(subjects)
+        self.subtopics: Tuple[Subtopic, ...] = tuple(subtopics)
+        self._subjects_by_title = MappingProxyType({s.title: s for s in subjects})
+        self._subtopics_by_key = MappingProxyType({st.key: st for st in subtopics})
+
+    def subject(self, title: str) -> Optional[Subject]:
+        return self._subjects_by_title.get(title)
+
+    def subject_by_id(self, subject_id: int) -> Optional[Subject]:
+        return self.subjects[subject_id] if 0 <= subject_id < len(self.subjects) else None
+
+    def subtopic(self, key: str) -> Optional[Subtopic]:
+        """Look up a subtopic by its "Subject - Subtopic" key."""
+        return self._subtopics_by_key.get(key)
+
+    def subtopic_by_id(self, subtopic_id: int) -> Optional[Subtopic]:
+        return self.subtopics[subtopic_id] if 0 <= subtopic_id < len(self.subtopics) else None
+
+    def resolve(self, topic: str) -> Tuple[Optional[Subject], Optional[Subtopic]]:
+        """Split a "Subject" or "Subject - Subtopic" string into its entries."""
+        parts = topic.split(' - ', 1)
+        subject = self.subject(parts[0])
+        subtopic = self.subtopic(topic) if len(parts) > 1 else None
+        return subject, subtopic
+
+    def subject_titles(self) -> Tuple[str, ...]:
+        return tuple(self._subjects_by_title.keys())
+
+    def topic_keys(self) -> Tuple[str, ...]:
+        return tuple(self._subtopics_by_key.keys())
+
+    def as_dict(self) -> Dict:
+        """Mutable copy of the raw document (e.g. for writing derived files)."""
+        return _thaw(self.data)
+
+
+_current: Optional[Taxonomy] = None
+_current_path: Optional[str] = None
+_lock = threading.Lock()
+
+
+def get_taxonomy(path: str = TOPICS_PATH) -> Taxonomy:
+    """Return the shared taxonomy, re-reading topics.json only when its mtime changes."""
+    global _current, _current_path
+    mtime = os.stat(path).st_mtime
+    taxonomy = _current
+    if taxonomy is not None and _current_path == path and taxonomy.mtime == mtime:
+        return taxonomy
+
+    with _lock:
+        if _current is None or _current_path != path or _current.mtime != mtime:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            _current = Taxonomy(data, mtime)
+            _current_path = path
+            print(f"Loaded taxonomy with subjects: {list(_current.subject_titles())}")
+        return _current
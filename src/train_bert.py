@@ -7,6 +7,7 @@ import numpy as np
 from tqdm import tqdm
 from sklearn.model_selection import train_test_split
 from database import db
+from taxonomy import get_taxonomy
 import time
 import random
 
@@ -68,10 +69,8 @@ def prepare_data():
     for subject in subjects_in_db:
         print(f"- {subject}")
 
-    # Load topics data
-    topics_path = os.path.join(project_root, 'data', 'raw', 'topics.json')
-    with open(topics_path, 'r', encoding='utf-8') as f:
-        topics_data = json.load(f)
+    # Load topics data from the shared taxonomy
+    taxonomy = get_taxonomy()
 
     texts = []
     labels = []
@@ -79,18 +78,18 @@ def prepare_data():
     current_label = 0
 
     # Process topics first, but only those found in the database
-    for topic in topics_data['topics']:
-        if topic['title'] in subjects_in_db:
-            if topic['title'] not in label_map:
-                label_map[topic['title']] = current_label
+    for subject in taxonomy.subjects:
+        if subject.title in subjects_in_db:
+            if subject.title not in label_map:
+                label_map[subject.title] = current_label
                 current_label += 1
 
             # Add topic content
-            for subtopic in topic['subtopics']:
-                key_points_text = '. '.join(subtopic['key_points'])
-                full_text = f"{subtopic['title']}. {key_points_text}"
+            for subtopic in subject.subtopics:
+                key_points_text = '. '.join(subtopic.key_points)
+                full_text = f"{subtopic.title}. {key_points_text}"
                 texts.append(full_text)
-                labels.append(label_map[topic['title']])
+                labels.append(label_map[subject.title])
 
     # Process questions from database
     for question in questions_data:
@@ -234,10 +233,8 @@ def generate_labels_json(label_map):
     for subject in subjects_in_db:
         print(f"- {subject}")
     
-    # Load topics.json
-    topics_path = os.path.join(project_root, 'data', 'raw', 'topics.json')
-    with open(topics_path, 'r', encoding='utf-8') as f:
-        topics_data = json.load(f)
+    # Load topics.json (mutable copy of the shared taxonomy)
+    topics_data = get_taxonomy().as_dict()
     
     # Create filtered version with only subjects in database
     filtered_topics = {"topics": []}